@@ -0,0 +1,184 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import islice
+
+import cache
+import config
+import session as gen_session
+
+
+def read_requests(input_path):
+    """Stream (request_id, query, error) tuples from a JSONL file one line at a time
+
+    Every request gets its own id, and so its own output file: lines without
+    one are named line-<n>, and an id seen before gets -<line number> appended.
+    """
+    seen = set()
+
+    def unique(request_id, line_number):
+        request_id = str(request_id)
+        while request_id in seen:
+            request_id = f"{request_id}-{line_number}"
+        seen.add(request_id)
+        return request_id
+
+    with open(input_path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            fallback_id = f"line-{line_number}"
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield unique(fallback_id, line_number), '', f"Invalid JSON on line {line_number}: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield unique(fallback_id, line_number), '', f"Line {line_number} is not a JSON object"
+                continue
+            request_id = record.get('id', record.get('request_id', fallback_id))
+            query = str(record.get('query') or record.get('prompt') or '').strip()
+            yield unique(request_id, line_number), query, None if query else 'Missing "query"'
+
+
+def safe_filename(request_id):
+    name = re.sub(r'[^A-Za-z0-9._-]', '_', request_id)
+    if name == request_id and name not in ('', '.', '..'):
+        return name
+    # Ids that had to be rewritten get a hash of the original so that, e.g.,
+    # "a/b" and "a_b" do not overwrite each other's page
+    return f"{name.strip('.') or 'request'}-{hashlib.sha1(request_id.encode('utf-8')).hexdigest()[:8]}"
+
+
+def render_to_file(request_id, query, results, output_dir, website_type=None, section_components=None):
+    """Worker task: render one page and write it next to the others"""
+    output_file = os.path.join(output_dir, f"{safe_filename(request_id)}.html")
+    start = time.perf_counter()
+    ttfb_ms = None
+    with open(output_file, 'w', encoding='utf-8') as f:
+        for chunk in cache.get_page_cache().stream(query, results, website_type, section_components):
+            if ttfb_ms is None:
+                ttfb_ms = (time.perf_counter() - start) * 1000
+            f.write(chunk)
+    generate_ms = (time.perf_counter() - start) * 1000
+
+    return {'output': output_file, 'ttfb_ms': ttfb_ms, 'generate_ms': generate_ms}
+
+
+def render_inline(*args):
+    """Run render_to_file in this process, wrapped in a completed Future like a pool task"""
+    future = Future()
+    try:
+        future.set_result(render_to_file(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def run_batch(input_path, output_dir=None, results_path=None, batch_size=None, workers=None):
+    output_dir = str(output_dir or config.BATCH_OUTPUT_DIR)
+    os.makedirs(output_dir, exist_ok=True)
+    results_path = results_path or os.path.join(output_dir, 'results.jsonl')
+    batch_size = batch_size or config.BATCH_RETRIEVE_SIZE
+    workers = workers or config.BATCH_WORKERS or os.cpu_count()
+
+    session = gen_session.get_session()
+    requests = read_requests(input_path)
+    # Bound the number of rendered-but-unwritten results so memory stays flat
+    max_in_flight = workers * batch_size * 2
+    pending = deque()
+    processed = 0
+    failed = 0
+    start = time.perf_counter()
+
+    def write_result(results_file, record, future):
+        nonlocal processed, failed
+        if future is not None:
+            try:
+                record.update(future.result())
+                record['status'] = 'ok'
+            except Exception as e:
+                record.update({'status': 'error', 'error': str(e)})
+        if record['status'] != 'ok':
+            failed += 1
+        processed += 1
+        results_file.write(json.dumps(record) + '\n')
+
+    # The LLM is one multi-GB model: forking after it (or torch) is loaded and
+    # loading a copy per worker would exhaust memory, so with LLM_ENABLED pages
+    # are generated one at a time in this process and the pool is not started
+    if config.LLM_ENABLED:
+        print(f"Processing {input_path} (batch size {batch_size}, LLM generation in this process)")
+        pool_context = nullcontext()
+    else:
+        print(f"Processing {input_path} (batch size {batch_size}, {workers} workers)")
+        pool_context = ProcessPoolExecutor(max_workers=workers)
+    with pool_context as pool, \
+            open(results_path, 'w', encoding='utf-8') as results_file:
+        while True:
+            chunk = list(islice(requests, batch_size))
+            if not chunk:
+                break
+
+            valid = [item for item in chunk if item[2] is None]
+            retrieve_start = time.perf_counter()
+            all_results, website_types, all_sections = session.analyze_many([query for _, query, _ in valid])
+            # Retrieval runs once per chunk, so report its cost amortized per request
+            retrieve_ms = (time.perf_counter() - retrieve_start) * 1000 / max(len(valid), 1)
+            retrieved = iter(zip(all_results, website_types, all_sections))
+
+            for item in chunk:
+                request_id, query, error = item
+                record = {'id': request_id, 'query': query}
+                if error:
+                    record.update({'status': 'error', 'error': error})
+                    pending.append((record, None))
+                    continue
+
+                results, website_type, sections = next(retrieved)
+                record['components'] = [r['component_id'] for r in results]
+                record['sections'] = {
+                    section: [r['component_id'] for r in section_results]
+                    for section, section_results in sections.items()
+                }
+                record['website_type'] = website_type
+                record['retrieve_ms'] = retrieve_ms
+                args = (request_id, query, results, output_dir, website_type, sections)
+                future = pool.submit(render_to_file, *args) if pool is not None else render_inline(*args)
+                pending.append((record, future))
+
+            while len(pending) > max_in_flight:
+                write_result(results_file, *pending.popleft())
+
+        while pending:
+            write_result(results_file, *pending.popleft())
+
+    elapsed = time.perf_counter() - start
+    print(f"\n✅ Processed {processed} requests ({failed} failed) in {elapsed:.1f}s "
+          f"({processed / elapsed if elapsed else 0:.1f} requests/s)")
+    print(f"📄 Pages written to: {output_dir}")
+    print(f"📊 Results written to: {results_path}")
+
+    return {'processed': processed, 'failed': failed, 'elapsed_s': elapsed, 'results_path': results_path}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Generate websites for every request in a JSONL file')
+    parser.add_argument('input', help='JSONL file with one {"id": ..., "query": ...} object per line')
+    parser.add_argument('--output-dir', default=None, help='Directory for generated pages')
+    parser.add_argument('--results', default=None, help='Results JSONL path (default: <output-dir>/results.jsonl)')
+    parser.add_argument('--batch-size', type=int, default=None, help='Queries retrieved per batch')
+    parser.add_argument('--workers', type=int, default=None, help='Generation worker processes')
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run_batch(args.input, args.output_dir, args.results, args.batch_size, args.workers)
@@ -0,0 +1,1125 @@
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+import config
+import embeddings
+import vector_store
+import generator
+import session as gen_session
+from server import percentile
+
+
+SAMPLE_QUERIES = [
+    'Create a portfolio website',
+    'Build an ecommerce product page',
+    'Make a landing page for a SaaS product',
+    'Create a tech blog with articles',
+    'Build a project management dashboard',
+]
+
+
+def benchmark_session(queries=None, rounds=3):
+    """Compare per-query reload (old generate_website path) against a warm session"""
+    queries = queries or SAMPLE_QUERIES
+
+    cold = []
+    for query in queries:
+        start = time.perf_counter()
+        index = vector_store.load_index(config.FAISS_INDEX_PATH)
+        metadata = embeddings.load_metadata(config.METADATA_PATH)
+        model = embeddings.load_embedding_model(config.EMBEDDING_MODEL, config.EMBEDDING_BACKEND)
+        results = vector_store.search_similar_components(
+            query, model, index, metadata, top_k=config.TOP_K_RESULTS
+        )
+        generator.generate_website_code(query, results)
+        cold.append((time.perf_counter() - start) * 1000)
+
+    session = gen_session.GeneratorSession()
+    warm = []
+    for _ in range(rounds):
+        for query in queries:
+            _, _, timings = session.generate(query)
+            warm.append(timings['total_ms'])
+
+    print("\n" + "="*60)
+    print("LATENCY PER QUERY: per-query reload vs warm session")
+    print("="*60)
+    print(f"{'':<16}{'mean ms':>12}{'p50 ms':>12}{'p99 ms':>12}")
+    for label, values in (('reload', cold), ('warm session', warm)):
+        mean = sum(values) / len(values)
+        print(f"{label:<16}{mean:>12.1f}{percentile(values, 50):>12.1f}{percentile(values, 99):>12.1f}")
+    print(f"Session load (paid once): {session.load_time * 1000:.0f} ms")
+    print(f"Speed-up: {(sum(cold) / len(cold)) / (sum(warm) / len(warm)):.1f}x")
+
+    return {'reload_ms': cold, 'warm_ms': warm, 'load_ms': session.load_time * 1000}
+
+
+def benchmark_server(num_requests=500, concurrency=32, endpoint='/retrieve'):
+    """Fire concurrent requests at a local server and report client-side p50/p99"""
+    import json
+    import threading
+    import urllib.request
+    from concurrent.futures import ThreadPoolExecutor
+
+    import server as http_server
+
+    srv = http_server.create_server(port=0)
+    host, port = srv.server_address[:2]
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://{host}:{port}{endpoint}"
+
+    def send(i):
+        body = json.dumps({'query': SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)]}).encode('utf-8')
+        request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+        start = time.perf_counter()
+        with urllib.request.urlopen(request) as response:
+            response.read()
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(send, range(num_requests)))
+    elapsed = time.perf_counter() - start
+
+    batcher = srv.batcher
+    srv.shutdown()
+    srv.server_close()
+
+    print("\n" + "="*60)
+    print(f"HTTP {endpoint}: {num_requests} requests, concurrency {concurrency}")
+    print("="*60)
+    print(f"Throughput: {num_requests / elapsed:.1f} req/s")
+    print(f"p50: {percentile(latencies, 50):.1f} ms | p99: {percentile(latencies, 99):.1f} ms")
+    print(f"Batches: {batcher.batches} (avg size {batcher.batched_queries / max(batcher.batches, 1):.1f})")
+
+    return {'latencies_ms': latencies, 'throughput': num_requests / elapsed}
+
+
+def benchmark_search_many(num_queries=1000):
+    """Compare one-query-at-a-time retrieval against a single batched search"""
+    session = gen_session.get_session()
+    queries = [f"{SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)]} #{i}" for i in range(num_queries)]
+
+    # Use the raw model so the query embedding cache does not skew the comparison
+    start = time.perf_counter()
+    for query in queries:
+        vector_store.search_similar_components(query, session.model, session.index, session.metadata)
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vector_store.search_many(queries, session.model, session.index, session.metadata)
+    batched = time.perf_counter() - start
+
+    print("\n" + "="*60)
+    print(f"RETRIEVAL THROUGHPUT: {num_queries} queries")
+    print("="*60)
+    print(f"Sequential: {num_queries / sequential:>10.1f} queries/s")
+    print(f"Batched:    {num_queries / batched:>10.1f} queries/s")
+    print(f"Speed-up:   {sequential / batched:.1f}x")
+
+    return {'sequential_qps': num_queries / sequential, 'batched_qps': num_queries / batched}
+
+
+def benchmark_sections(num_queries=200):
+    """Per-prompt retrieval cost: prompt only, batched section sub-queries, sequential sub-queries"""
+    session = gen_session.get_session()
+    # Distinct prompts so the query embedding cache does not hide encode cost
+    queries = [f"{SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)]} #{i}" for i in range(num_queries)]
+    enabled = config.SECTION_RETRIEVAL
+    report = {}
+    try:
+        config.SECTION_RETRIEVAL = False
+        start = time.perf_counter()
+        for query in queries:
+            session.analyze_many([f"{query} a"])
+        report['prompt_only_ms'] = (time.perf_counter() - start) / num_queries * 1000
+
+        config.SECTION_RETRIEVAL = True
+        start = time.perf_counter()
+        for query in queries:
+            session.analyze_many([f"{query} b"])
+        report['batched_sections_ms'] = (time.perf_counter() - start) / num_queries * 1000
+    finally:
+        config.SECTION_RETRIEVAL = enabled
+
+    start = time.perf_counter()
+    for query in queries:
+        for text in [f"{query} c"] + generator.section_queries(f"{query} c"):
+            session.retrieve(text)
+    report['sequential_sections_ms'] = (time.perf_counter() - start) / num_queries * 1000
+
+    print("\n" + "="*60)
+    print(f"SECTION RETRIEVAL: {num_queries} prompts, {len(generator.SECTION_QUERIES)} section sub-queries each")
+    print("="*60)
+    print(f"Prompt only:          {report['prompt_only_ms']:>8.2f} ms/prompt")
+    print(f"Batched sections:     {report['batched_sections_ms']:>8.2f} ms/prompt")
+    print(f"Sequential sections:  {report['sequential_sections_ms']:>8.2f} ms/prompt")
+
+    return report
+
+
+def benchmark_query_cache(num_queries=2000, distinct=50):
+    """Measure encode latency for repeated prompts with and without the query cache"""
+    import cache
+
+    session = gen_session.get_session()
+    queries = [f"  {SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)].upper()} v{i % distinct}" for i in range(num_queries)]
+    query_cache = cache.EmbeddingCache(session.model, session.model_name, max_size=distinct * 2)
+
+    start = time.perf_counter()
+    for query in queries:
+        session.model.encode([query], convert_to_numpy=True)
+    uncached = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for query in queries:
+        query_cache.encode([query])
+    cached = time.perf_counter() - start
+
+    stats = query_cache.stats()
+    print("\n" + "="*60)
+    print(f"QUERY EMBEDDING CACHE: {num_queries} queries, {distinct} distinct")
+    print("="*60)
+    print(f"Uncached: {uncached / num_queries * 1000:.3f} ms/query")
+    print(f"Cached:   {cached / num_queries * 1000:.3f} ms/query (hit rate {stats['hit_rate']:.1%})")
+
+    return {'uncached_ms': uncached / num_queries * 1000, 'cached_ms': cached / num_queries * 1000, **stats}
+
+
+def benchmark_page_cache(num_requests=2000, distinct=20):
+    """Measure page render cost with and without the end-to-end page cache"""
+    import cache
+
+    session = gen_session.get_session()
+    queries = [f"{SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)]} v{i % distinct}" for i in range(num_requests)]
+    retrieved = {query: session.retrieve(query) for query in set(queries)}
+    page_cache = cache.PageCache()
+
+    start = time.perf_counter()
+    for query in queries:
+        generator.generate_website_code(query, retrieved[query])
+    uncached = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for query in queries:
+        page_cache.generate(query, retrieved[query])
+    cached = time.perf_counter() - start
+
+    stats = page_cache.stats()
+    print("\n" + "="*60)
+    print(f"PAGE CACHE: {num_requests} requests, {distinct} distinct")
+    print("="*60)
+    print(f"Uncached: {uncached / num_requests * 1e6:.1f} us/page")
+    print(f"Cached:   {cached / num_requests * 1e6:.1f} us/page (hit rate {stats['hit_rate']:.1%})")
+    print(f"Bytes saved: {stats['bytes_saved']:,}")
+
+    return {'uncached_us': uncached / num_requests * 1e6, 'cached_us': cached / num_requests * 1e6, **stats}
+
+
+def benchmark_streaming(num_requests=500):
+    """Time to first chunk vs total render time for streamed pages"""
+    session = gen_session.get_session()
+    queries = [f"{SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)]} #{i}" for i in range(num_requests)]
+    retrieved = session.retrieve_many(queries)
+
+    render = {'ttfb': [], 'total': []}
+    for query, results in zip(queries, retrieved):
+        start = time.perf_counter()
+        for i, _ in enumerate(generator.iter_website_code(query, results)):
+            if i == 0:
+                render['ttfb'].append((time.perf_counter() - start) * 1000)
+        render['total'].append((time.perf_counter() - start) * 1000)
+
+    # End to end through the session: retrieval, page cache and rendering
+    end_to_end = {'ttfb': [], 'total': []}
+    for query in queries:
+        chunks, _, timings = session.stream(query)
+        for _ in chunks:
+            pass
+        end_to_end['ttfb'].append(timings['ttfb_ms'])
+        end_to_end['total'].append(timings['total_ms'])
+
+    print("\n" + "="*60)
+    print(f"STREAMING: {num_requests} pages, first chunk vs full page")
+    print("="*60)
+    print(f"{'':<14}{'ttfb p50':>10}{'ttfb p99':>10}{'total p50':>11}{'total p99':>11}")
+    for label, values in (('render', render), ('session', end_to_end)):
+        print(f"{label:<14}{percentile(values['ttfb'], 50):>10.3f}{percentile(values['ttfb'], 99):>10.3f}"
+              f"{percentile(values['total'], 50):>11.3f}{percentile(values['total'], 99):>11.3f}")
+    print("(milliseconds)")
+
+    return {'render': render, 'session': end_to_end}
+
+
+WEBSITE_TYPE_QUERIES = {
+    'portfolio': 'Create a portfolio website',
+    'blog': 'Create a tech blog with articles',
+    'ecommerce': 'Build an ecommerce product page',
+    'landing': 'Make a landing page for a SaaS product',
+    'general': 'Build a project management dashboard',
+}
+
+
+def benchmark_templates(pages=20000):
+    """Pages/sec per website type: precompiled templates vs rebuilding every section"""
+    report = {}
+    for website_type, query in WEBSITE_TYPE_QUERIES.items():
+        start = time.perf_counter()
+        for _ in range(pages):
+            ''.join(generator.iter_page_sections(generator.detect_website_type(query), query, []))
+        rebuilt = pages / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in range(pages):
+            generator.create_structured_website(query, [])
+        compiled = pages / (time.perf_counter() - start)
+        report[website_type] = {'rebuilt_pages_s': rebuilt, 'compiled_pages_s': compiled}
+
+    print("\n" + "="*60)
+    print(f"TEMPLATES: pages/sec over {pages} renders per website type")
+    print("="*60)
+    print(f"{'type':<12}{'rebuilt':>12}{'compiled':>12}{'speed-up':>10}")
+    for website_type, values in report.items():
+        print(f"{website_type:<12}{values['rebuilt_pages_s']:>12,.0f}{values['compiled_pages_s']:>12,.0f}"
+              f"{values['compiled_pages_s'] / values['rebuilt_pages_s']:>9.1f}x")
+
+    return report
+
+
+def benchmark_fragments(pages=5000, top_ks=(0, 5, 20)):
+    """Render cost as retrieved snippets grow: cached fragments vs sanitizing per request"""
+    import fragments
+
+    metadata = [item for item in embeddings.load_metadata(config.METADATA_PATH) if item is not None]
+    fragment_cache = fragments.FragmentCache(config.METADATA_PATH)
+    query = WEBSITE_TYPE_QUERIES['general']
+    # Section slots stay empty so only the main components section varies
+    empty_sections = {f'{section}_components': '' for section, _ in generator.SECTION_QUERIES}
+
+    report = {}
+    for top_k in top_ks:
+        components = [metadata[i % len(metadata)] for i in range(top_k)]
+        fragment_cache.cards(components)
+
+        start = time.perf_counter()
+        for _ in range(pages):
+            cards = ''.join(fragments.render_component_card(c) for c in components)
+            generator.render_fragment(
+                generator.PAGE_DOCUMENTS['general'],
+                {**empty_sections, 'query': query, 'components': generator.create_components_section(cards)}
+            )
+        uncached = (time.perf_counter() - start) / pages * 1e6
+
+        start = time.perf_counter()
+        for _ in range(pages):
+            generator.render_fragment(
+                generator.PAGE_DOCUMENTS['general'],
+                {**empty_sections, 'query': query, 'components': generator.create_components_section(fragment_cache.cards(components))}
+            )
+        cached = (time.perf_counter() - start) / pages * 1e6
+        report[top_k] = {'per_request_us': uncached, 'cached_us': cached}
+
+    print("\n" + "="*60)
+    print(f"SNIPPET FRAGMENTS: render cost per page over {pages} pages")
+    print("="*60)
+    print(f"{'components':<12}{'per request us':>16}{'cached us':>12}")
+    for top_k, values in report.items():
+        print(f"{top_k:<12}{values['per_request_us']:>16.1f}{values['cached_us']:>12.1f}")
+
+    return report
+
+
+INTENT_EVAL_QUERIES = [
+    ('My personal site to show off illustration work', 'portfolio'),
+    ('Resume page for a data scientist', 'portfolio'),
+    ('Showcase of architecture projects I designed', 'portfolio'),
+    ('About me page with my experience and skills', 'portfolio'),
+    ('Gallery of my wedding photography', 'portfolio'),
+    ('Write weekly posts about machine learning', 'blog'),
+    ('A place to publish my short stories', 'blog'),
+    ('Daily news about local sports', 'blog'),
+    ('Food writing with recipes and stories', 'blog'),
+    ('Article archive for our engineering team', 'blog'),
+    ('Sell vintage furniture online', 'ecommerce'),
+    ('Product catalog with a cart for coffee beans', 'ecommerce'),
+    ('Shop for phone accessories with checkout', 'ecommerce'),
+    ('Online store for organic skincare', 'ecommerce'),
+    ('Buy concert tickets and merch', 'ecommerce'),
+    ('Launch page for our AI writing assistant', 'landing'),
+    ('Collect signups for a new budgeting app', 'landing'),
+    ('Pricing and features page for a startup', 'landing'),
+    ('Marketing page for a webinar', 'landing'),
+    ('Waitlist page for a beta launch', 'landing'),
+    ('Website for a yoga studio with class schedule', 'general'),
+    ('Analytics dashboard for sales metrics', 'general'),
+    ('Law firm website with practice areas', 'general'),
+    ('Internal tool to manage inventory tables', 'general'),
+    ('Website for a city library', 'general'),
+]
+
+
+def benchmark_intent(rounds=200):
+    """Accuracy and per-query cost of nearest-centroid intent vs keyword rules"""
+    import intent
+
+    session = gen_session.get_session()
+    classifier = session.intents or intent.IntentClassifier(session.model)
+    queries = [query for query, _ in INTENT_EVAL_QUERIES]
+    labels = [label for _, label in INTENT_EVAL_QUERIES]
+    # The retrieval path already holds these vectors; only classification is timed
+    vectors = session.model.encode(queries, convert_to_numpy=True)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        keyword = [generator.detect_website_type(query) for query in queries]
+    keyword_us = (time.perf_counter() - start) / (rounds * len(queries)) * 1e6
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for row in range(len(queries)):
+            classifier.classify(vectors[row:row + 1])
+    centroid_us = (time.perf_counter() - start) / (rounds * len(queries)) * 1e6
+
+    predicted = [
+        generator.resolve_website_type(query, website_type)
+        for query, website_type in zip(queries, classifier.classify(vectors))
+    ]
+    keyword_accuracy = sum(a == b for a, b in zip(keyword, labels)) / len(labels)
+    centroid_accuracy = sum(a == b for a, b in zip(predicted, labels)) / len(labels)
+
+    print("\n" + "="*60)
+    print(f"INTENT: {len(labels)} labelled queries, {len(classifier.labels)} types")
+    print("="*60)
+    print(f"{'':<18}{'accuracy':>10}{'us/query':>10}")
+    print(f"{'keyword rules':<18}{keyword_accuracy:>10.1%}{keyword_us:>10.2f}")
+    print(f"{'nearest centroid':<18}{centroid_accuracy:>10.1%}{centroid_us:>10.2f}")
+
+    return {
+        'keyword_accuracy': keyword_accuracy,
+        'centroid_accuracy': centroid_accuracy,
+        'keyword_us': keyword_us,
+        'centroid_us': centroid_us,
+    }
+
+
+def benchmark_llm(queries=None, budget_s=None):
+    """LLM load time, time to first token, throughput and in-budget rate for LLM_MODEL"""
+    queries = queries or SAMPLE_QUERIES
+    budget_s = budget_s or config.LLM_LATENCY_BUDGET_S
+    session = gen_session.get_session()
+
+    start = time.perf_counter()
+    llm = generator.get_llm(timeout=None)
+    load_s = time.perf_counter() - start
+    if llm is None:
+        print(f"❌ Could not load {config.LLM_MODEL}")
+        return {'regression': True}
+
+    ttft, rates, complete = [], [], 0
+    for query in queries:
+        prompt = generator.build_llm_prompt(query, session.retrieve(query), llm['tokenizer'])
+        start = time.perf_counter()
+        first = None
+        pieces = []
+        for piece in generator.iter_llm_tokens(llm, prompt, start + budget_s):
+            if first is None:
+                first = time.perf_counter() - start
+            pieces.append(piece)
+        elapsed = time.perf_counter() - start
+        if first is not None:
+            ttft.append(first * 1000)
+        rates.append(len(pieces) / elapsed if elapsed else 0.0)
+        complete += generator.extract_html(''.join(pieces)) is not None
+
+    print("\n" + "="*60)
+    print(f"LLM: {config.LLM_MODEL}, {len(queries)} prompts, {budget_s:.0f}s budget")
+    print("="*60)
+    print(f"Load (paid once): {load_s:.1f}s")
+    print(f"Time to first token p50: {percentile(ttft, 50):.0f} ms")
+    print(f"Throughput p50: {percentile(rates, 50):.1f} chunks/s")
+    print(f"Complete pages within budget: {complete}/{len(queries)} (others fall back to the template)")
+
+    return {'load_s': load_s, 'ttft_ms': ttft, 'chunks_per_s': rates, 'complete': complete}
+
+
+NAME_QUERY_TEMPLATES = ['{name}', 'I need a {name}', 'Add a {name} to my page', '{name} component for a dashboard']
+
+
+def synthetic_lexical_catalog(num_docs, vocab_size=50000, words_per_doc=30, seed=0):
+    """Zipf-distributed word documents shaped like catalog rows"""
+    rng = np.random.default_rng(seed)
+    words = np.array([f"w{i}" for i in range(vocab_size)])
+    ranks = np.minimum(rng.zipf(1.2, size=(num_docs, words_per_doc)), vocab_size) - 1
+    for row in ranks:
+        yield {'name': ' '.join(words[row[:2]]), 'category': words[row[2]], 'description': ' '.join(words[row[3:]]), 'use_cases': ''}
+
+
+def exhaustive_bm25(index, query_text, top_k, allowed=None):
+    """Reference BM25 top_k scores from summing every posting of every query term"""
+    import lexical
+
+    term_ids = sorted({index.vocab[t] for t in lexical.tokenize(query_text) if t in index.vocab})
+    if not term_ids:
+        return np.zeros(0, dtype='float32')
+    docs = np.concatenate([index.docs[index.offsets[t]:index.offsets[t + 1]] for t in term_ids])
+    impacts = np.concatenate([index.impacts[index.offsets[t]:index.offsets[t + 1]] for t in term_ids])
+    scores = np.bincount(docs, weights=impacts.astype('float32'), minlength=index.num_slots).astype('float32')
+    if allowed is not None:
+        mask = np.zeros(len(scores), dtype=bool)
+        mask[allowed] = True
+        scores[~mask] = 0
+    top = np.sort(scores)[::-1][:top_k]
+    return top[top > 0]
+
+
+def benchmark_hybrid(scale_docs=1000000, scale_queries=1000):
+    """Exact-name retrieval quality and latency: dense-only vs BM25 + dense fusion"""
+    import tempfile
+
+    import lexical
+
+    session = gen_session.get_session()
+    bm25 = session.bm25 or lexical.load_bm25(config.BM25_PATH)
+    if bm25 is None:
+        print(f"❌ No BM25 index at {config.BM25_PATH}; run `python main.py --rebuild` first")
+        return {'regression': True}
+
+    metadata = [item for item in session.metadata if item is not None]
+    cases = [(template.format(name=item['name']), item['component_id'])
+             for item in metadata for template in NAME_QUERY_TEMPLATES]
+    queries = [query for query, _ in cases]
+
+    report = {}
+    for label, index_bm25 in (('dense', None), ('hybrid', bm25)):
+        latencies = []
+        ranks = []
+        for query, target in cases:
+            start = time.perf_counter()
+            results = vector_store.search_similar_components(
+                query, session.model, session.index, session.metadata, top_k=config.TOP_K_RESULTS, bm25=index_bm25
+            )
+            latencies.append((time.perf_counter() - start) * 1000)
+            ids = [r['component_id'] for r in results]
+            ranks.append(ids.index(target) + 1 if target in ids else None)
+        report[label] = {
+            'hit@1': sum(r == 1 for r in ranks) / len(ranks),
+            f'hit@{config.TOP_K_RESULTS}': sum(r is not None for r in ranks) / len(ranks),
+            'mrr': sum(1 / r for r in ranks if r) / len(ranks),
+            'p50_ms': percentile(latencies, 50),
+        }
+
+    # Lexical scoring cost on a large synthetic catalog
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        writer = lexical.BM25Writer(f"{tmp}/bm25")
+        writer.append(synthetic_lexical_catalog(scale_docs))
+        writer.close()
+        build_s = time.perf_counter() - start
+        large = lexical.BM25Index(f"{tmp}/bm25")
+        rng = np.random.default_rng(1)
+        scale_latencies = []
+        exhaustive_latencies = []
+        exact_matches = []
+        # A 1% slice of the catalog stands in for a small filtered category
+        allowed = np.sort(rng.choice(scale_docs, scale_docs // 100, replace=False))
+        for i in range(scale_queries):
+            terms = np.minimum(rng.zipf(1.2, size=3), 50000) - 1
+            query = ' '.join(f"w{t}" for t in terms)
+            query_allowed = allowed if i % 2 else None
+            start = time.perf_counter()
+            _, scores = large.search(query, config.HYBRID_CANDIDATES, allowed=query_allowed)
+            scale_latencies.append((time.perf_counter() - start) * 1000)
+            # Compare scores rather than ids, since equal scores may tie-break differently
+            start = time.perf_counter()
+            exact = exhaustive_bm25(large, query, config.HYBRID_CANDIDATES, allowed=query_allowed)
+            exhaustive_latencies.append((time.perf_counter() - start) * 1000)
+            exact_matches.append(len(scores) == len(exact) and np.allclose(scores, exact, rtol=1e-3))
+        posting_bytes = sum(
+            array.nbytes for array in (
+                large.docs, large.impacts, large.offsets, large.rest_maxima, large.top_docs, large.top_impacts, large.top_offsets
+            )
+        )
+
+    print("\n" + "="*60)
+    print(f"HYBRID RETRIEVAL: {len(queries)} exact-name queries")
+    print("="*60)
+    print(f"{'':<10}{'hit@1':>8}{'hit@' + str(config.TOP_K_RESULTS):>8}{'MRR':>8}{'p50 ms':>10}")
+    for label, values in report.items():
+        print(f"{label:<10}{values['hit@1']:>8.1%}{values[f'hit@{config.TOP_K_RESULTS}']:>8.1%}"
+              f"{values['mrr']:>8.3f}{values['p50_ms']:>10.2f}")
+    print(f"\nBM25 over {scale_docs:,} synthetic docs: built in {build_s:.1f}s, "
+          f"{posting_bytes / 1e6:.0f} MB of postings")
+    print(f"Lexical search p50: {percentile(scale_latencies, 50):.3f} ms, p99: {percentile(scale_latencies, 99):.3f} ms "
+          f"(exhaustive p50: {percentile(exhaustive_latencies, 50):.3f} ms)")
+    print(f"Queries whose top-{config.HYBRID_CANDIDATES} scores match exhaustive scoring, half of them "
+          f"filtered to 1% of docs: {sum(exact_matches) / len(exact_matches):.1%}")
+
+    report['scale'] = {
+        'build_s': build_s,
+        'p50_ms': percentile(scale_latencies, 50),
+        'p99_ms': percentile(scale_latencies, 99),
+        'exhaustive_p50_ms': percentile(exhaustive_latencies, 50),
+        'exact': sum(exact_matches) / len(exact_matches),
+    }
+    report['regression'] = not all(exact_matches)
+    return report
+
+
+def synthetic_embeddings(num_vectors, dimension=384, num_clusters=256, seed=0):
+    """Clustered random vectors that behave more like sentence embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((num_clusters, dimension)).astype('float32')
+    labels = rng.integers(0, num_clusters, num_vectors)
+    vectors = centers[labels] + 0.5 * rng.standard_normal((num_vectors, dimension)).astype('float32')
+    return vectors
+
+
+def recall_at_k(approx_indices, exact_indices):
+    hits = sum(len(set(a) & set(e)) for a, e in zip(approx_indices.tolist(), exact_indices.tolist()))
+    return hits / exact_indices.size
+
+
+def benchmark_ann(num_vectors=100000, num_queries=1000, top_k=10):
+    """Recall@k, QPS, build time and memory of each index type against the flat index"""
+    vectors = synthetic_embeddings(num_vectors + num_queries)
+    database, queries = vectors[:num_vectors], vectors[num_vectors:]
+
+    print("\n" + "="*60)
+    print(f"ANN INDEXES: {num_vectors} vectors, {num_queries} queries, recall@{top_k}")
+    print("="*60)
+    print(f"{'index':<24}{'recall':>8}{'QPS':>10}{'build s':>10}{'MB':>9}")
+
+    exact = None
+    report = {}
+    sweeps = [('flat', False, {}), ('flat', True, {})]
+    sweeps += [('hnsw', False, {'ef_search': ef}) for ef in (16, 64, 256)]
+    sweeps += [('ivf_flat', False, {'nprobe': n}) for n in (1, 8, 32)]
+    sweeps += [('ivf_pq', False, {'nprobe': n}) for n in (1, 8, 32)]
+
+    built = {}
+    for index_type, fp16, params in sweeps:
+        if (index_type, fp16) not in built:
+            start = time.perf_counter()
+            index = vector_store.create_faiss_index(database.shape[1], index_type, num_vectors, fp16=fp16)
+            vector_store.train_index(index, database)
+            index.add_with_ids(vector_store.prepare_vectors(index, database), np.arange(num_vectors))
+            built[index_type, fp16] = (index, time.perf_counter() - start)
+        index, build_time = built[index_type, fp16]
+        vector_store.set_search_params(index, **params)
+
+        start = time.perf_counter()
+        _, indices = index.search(vector_store.prepare_vectors(index, queries), top_k)
+        qps = num_queries / (time.perf_counter() - start)
+        if exact is None:
+            exact = indices
+        recall = recall_at_k(indices, exact)
+        memory_mb = vector_store.index_memory_bytes(index) / 1e6
+
+        label = index_type + (' fp16' if fp16 else '') + ''.join(f" {k}={v}" for k, v in params.items())
+        print(f"{label:<24}{recall:>8.3f}{qps:>10.0f}{build_time:>10.1f}{memory_mb:>9.1f}")
+        report[label] = {'recall': recall, 'qps': qps, 'build_s': build_time, 'memory_mb': memory_mb}
+
+    return report
+
+
+def benchmark_filtered(num_vectors=200000, num_queries=500, top_k=10, overfetch=10):
+    """Category-filtered search: over-fetch-then-filter vs per-filter sub-indexes"""
+    vectors = synthetic_embeddings(num_vectors + num_queries)
+    database, queries = vectors[:num_vectors], vectors[num_vectors:]
+    # Skewed category sizes: 1%, 10% and 89% of the catalog
+    rng = np.random.default_rng(1)
+    categories = rng.choice(['Dashboard', 'UI', 'Foundation'], num_vectors, p=[0.01, 0.1, 0.89])
+    metadata = [{'category': category} for category in categories.tolist()]
+
+    index = vector_store.create_faiss_index(database.shape[1], num_vectors=num_vectors)
+    vector_store.train_index(index, database)
+    index.add_with_ids(vector_store.prepare_vectors(index, database), np.arange(num_vectors))
+    queries = vector_store.prepare_vectors(index, queries)
+    subsets = vector_store.SubsetIndexes(index, metadata)
+
+    print("\n" + "="*60)
+    print(f"FILTERED SEARCH: {num_vectors} vectors ({config.INDEX_TYPE}), {num_queries} queries, top {top_k}")
+    print("="*60)
+    print(f"{'category':<12}{'size':>8}{'method':>12}{'ms/query':>10}{'recall':>8}{'build ms':>10}")
+
+    report = {}
+    for category in ('Dashboard', 'UI', 'Foundation'):
+        slots = np.flatnonzero(categories == category)
+        exact_index = vector_store.SubsetIndex(index, slots, max_size=len(slots))
+        _, exact = exact_index.search(queries, top_k)
+
+        start = time.perf_counter()
+        _, indices = index.search(queries, top_k * overfetch)
+        keep = categories[np.clip(indices, 0, None)] == category
+        overfetched = [row[ok][:top_k] for row, ok in zip(indices, keep)]
+        overfetch_ms = (time.perf_counter() - start) / num_queries * 1000
+        overfetch_recall = sum(len(set(a.tolist()) & set(e.tolist())) for a, e in zip(overfetched, exact)) / exact.size
+
+        start = time.perf_counter()
+        subset = subsets.get({'category': category})
+        build_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        _, indices = subset.search(queries, top_k)
+        filtered_ms = (time.perf_counter() - start) / num_queries * 1000
+        filtered_recall = recall_at_k(indices, exact)
+
+        print(f"{category:<12}{len(slots):>8}{'overfetch':>12}{overfetch_ms:>10.3f}{overfetch_recall:>8.3f}{'':>10}")
+        print(f"{'':<12}{'':>8}{'subset':>12}{filtered_ms:>10.3f}{filtered_recall:>8.3f}{build_ms:>10.1f}")
+        report[category] = {
+            'size': int(len(slots)),
+            'overfetch_ms': overfetch_ms,
+            'overfetch_recall': overfetch_recall,
+            'filtered_ms': filtered_ms,
+            'filtered_recall': filtered_recall,
+            'build_ms': build_ms,
+        }
+
+    return report
+
+
+def benchmark_mmr(num_vectors=100000, num_queries=1000, top_k=None, lambdas=(1.0, 0.7, 0.5, 0.3)):
+    """Added latency per query of MMR re-ranking, with relevance and diversity of the results"""
+    top_k = top_k or config.TOP_K_RESULTS
+    # Tight clusters stand in for families of near-duplicate components
+    vectors = synthetic_embeddings(num_vectors + num_queries, num_clusters=2000)
+    database, queries = vectors[:num_vectors], vectors[num_vectors:]
+    index = vector_store.create_faiss_index(database.shape[1], num_vectors=num_vectors)
+    vector_store.train_index(index, database)
+    vector_store.add_vectors_to_index(index, database)
+    metadata = [{'component_id': i} for i in range(num_vectors)]
+    unit_queries = vector_store.prepare_vectors(index, queries)
+
+    def evaluate(mmr_lambda):
+        start = time.perf_counter()
+        results = [
+            vector_store.search_vectors(query[None], index, metadata, top_k=top_k, mmr_lambda=mmr_lambda)[0]
+            for query in queries
+        ]
+        ms = (time.perf_counter() - start) / num_queries * 1000
+        ids = np.array([[r['component_id'] for r in row] for row in results])
+        found = vector_store.candidate_vectors(index, ids)
+        relevance = float(np.einsum('qkd,qd->qk', found, unit_queries).mean())
+        pairwise = found @ found.transpose(0, 2, 1)
+        redundancy = float(pairwise[:, ~np.eye(top_k, dtype=bool)].mean())
+        return {'ms': ms, 'relevance': relevance, 'redundancy': redundancy}
+
+    # The re-rank stage alone (reconstruct + MMR), one query at a time
+    distances, indices = index.search(unit_queries, max(top_k, config.MMR_CANDIDATES))
+    scores = vector_store.scores_from_distances(distances, index.metric_type)
+
+    def rerank_ms(mmr_lambda):
+        start = time.perf_counter()
+        for i in range(num_queries):
+            vector_store.diversify(index, scores[i:i + 1], indices[i:i + 1], top_k, mmr_lambda)
+        return (time.perf_counter() - start) / num_queries * 1000
+
+    print("\n" + "="*60)
+    print(f"MMR RE-RANKING: {num_vectors} vectors ({config.INDEX_TYPE}), top {top_k} of {config.MMR_CANDIDATES}")
+    print("="*60)
+    print(f"{'':<14}{'ms/query':>10}{'rerank ms':>11}{'relevance':>11}{'redundancy':>12}")
+    baseline = evaluate(None)
+    report = {'none': baseline}
+    print(f"{'no MMR':<14}{baseline['ms']:>10.3f}{'':>11}{baseline['relevance']:>11.3f}{baseline['redundancy']:>12.3f}")
+    for mmr_lambda in lambdas:
+        values = evaluate(mmr_lambda)
+        values['rerank_ms'] = rerank_ms(mmr_lambda)
+        report[f"lambda={mmr_lambda}"] = values
+        print(f"{f'lambda={mmr_lambda}':<14}{values['ms']:>10.3f}{values['rerank_ms']:>11.3f}"
+              f"{values['relevance']:>11.3f}{values['redundancy']:>12.3f}")
+
+    return report
+
+
+def benchmark_shards(num_vectors=200000, num_queries=500, top_k=10, shard_counts=(1, 2, 4, 8)):
+    """Build, save/load and search cost of a sharded index as the shard count grows"""
+    import tempfile
+    from pathlib import Path
+
+    vectors = synthetic_embeddings(num_vectors + num_queries)
+    database, queries = vectors[:num_vectors], vectors[num_vectors:]
+    metadata = [{'component_id': f"comp_{i:07d}", 'category': 'UI'} for i in range(num_vectors)]
+
+    print("\n" + "="*60)
+    print(f"SHARDED INDEX: {num_vectors} vectors ({config.INDEX_TYPE}), {num_queries} queries, top {top_k}")
+    print("="*60)
+    print(f"{'shards':>6}{'build s':>9}{'save s':>8}{'load s':>8}{'p50 ms':>8}{'batch QPS':>11}{'recall':>8}")
+
+    report = {}
+    baseline = None
+    for num_shards in shard_counts:
+        start = time.perf_counter()
+        index = vector_store.build_sharded_index(database, metadata, num_shards, 'hash')
+        build_s = time.perf_counter() - start
+        with tempfile.TemporaryDirectory() as tmp:
+            index_path = Path(tmp) / 'index.faiss'
+            start = time.perf_counter()
+            vector_store.save_index(index, index_path)
+            save_s = time.perf_counter() - start
+            start = time.perf_counter()
+            index = vector_store.load_index(index_path)
+            load_s = time.perf_counter() - start
+
+        prepared = vector_store.prepare_vectors(index, queries)
+        latencies = []
+        for query in prepared:
+            start = time.perf_counter()
+            index.search(query[None], top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        _, indices = index.search(prepared, top_k)
+        qps = num_queries / (time.perf_counter() - start)
+        if baseline is None:
+            baseline = indices
+        recall = recall_at_k(indices, baseline)
+
+        print(f"{num_shards:>6}{build_s:>9.2f}{save_s:>8.2f}{load_s:>8.2f}"
+              f"{percentile(latencies, 50):>8.2f}{qps:>11.0f}{recall:>8.3f}")
+        report[num_shards] = {
+            'build_s': build_s, 'save_s': save_s, 'load_s': load_s,
+            'p50_ms': percentile(latencies, 50), 'batch_qps': qps, 'recall': recall,
+        }
+        index.pool.shutdown()
+
+    return report
+
+
+def benchmark_metadata(num_rows=200000, lookups=1000):
+    """Open time, Python heap on open and top-5 lookup cost: pickled list vs columnar store"""
+    import pickle
+    import tempfile
+    import tracemalloc
+    from pathlib import Path
+
+    snippet = '<div class="p-4 bg-white rounded-lg shadow">' + 'x' * 400 + '</div>'
+    metadata = [
+        {
+            'component_id': f"comp_{i:07d}",
+            'name': f"Component {i}",
+            'category': ('UI', 'Foundation', 'Dashboard')[i % 3],
+            'description': f"Description of component {i} " * 4,
+            'code_snippet': snippet,
+            'use_cases': 'Forms, dashboards, landing pages',
+        }
+        for i in range(num_rows)
+    ]
+    rows = np.random.default_rng(0).integers(0, num_rows, (lookups, 5))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pickle_path = Path(tmp) / 'metadata.pkl'
+        columnar_path = Path(tmp) / 'metadata'
+        with open(pickle_path, 'wb') as f:
+            pickle.dump(metadata, f)
+        embeddings.save_metadata(metadata, columnar_path)
+        del metadata
+
+        report = {}
+        for label, path in (('pickle', pickle_path), ('columnar', columnar_path)):
+            tracemalloc.start()
+            start = time.perf_counter()
+            store = embeddings.load_metadata(path)
+            open_ms = (time.perf_counter() - start) * 1000
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            start = time.perf_counter()
+            for row in rows.tolist():
+                [store[i] for i in row]
+            lookup_us = (time.perf_counter() - start) / lookups * 1e6
+            report[label] = {'open_ms': open_ms, 'top5_lookup_us': lookup_us, 'heap_mb': peak / 1e6}
+            del store
+
+    print("\n" + "="*60)
+    print(f"METADATA STORE: {num_rows} rows, top-5 lookups")
+    print("="*60)
+    print(f"{'':<12}{'open ms':>10}{'lookup us':>12}{'heap MB':>10}")
+    for label, values in report.items():
+        print(f"{label:<12}{values['open_ms']:>10.1f}{values['top5_lookup_us']:>12.1f}{values['heap_mb']:>10.1f}")
+
+    return report
+
+
+def write_synthetic_catalog(path, num_rows):
+    import pandas as pd
+
+    base = pd.read_csv(config.COMPONENTS_CSV)
+    df = base.iloc[np.arange(num_rows) % len(base)].reset_index(drop=True)
+    df['component_id'] = [f"synthetic_{i:07d}" for i in range(num_rows)]
+    df.to_csv(path, index=False)
+
+
+def benchmark_ingest(num_rows=200000):
+    """Rows/sec of CSV -> (texts, metadata): iterrows loop vs vectorized vs chunked"""
+    import tempfile
+    from pathlib import Path
+
+    import pandas as pd
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / 'components.csv'
+        write_synthetic_catalog(csv_path, num_rows)
+
+        start = time.perf_counter()
+        df = pd.read_csv(csv_path)
+        texts, metadata = [], []
+        for _, row in df.iterrows():
+            texts.append(embeddings.create_text_from_row(row))
+            metadata.append({field: row[field] for field in embeddings.METADATA_FIELDS})
+        iterrows = time.perf_counter() - start
+
+        start = time.perf_counter()
+        embeddings.load_components(csv_path)
+        vectorized = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in embeddings.iter_component_chunks(csv_path):
+            pass
+        chunked = time.perf_counter() - start
+
+    print("\n" + "="*60)
+    print(f"CSV INGEST: {num_rows} rows (text + metadata preparation)")
+    print("="*60)
+    for label, elapsed in (('iterrows', iterrows), ('vectorized', vectorized), ('chunked', chunked)):
+        print(f"{label:<12}{num_rows / elapsed:>12.0f} rows/sec")
+
+    return {
+        'iterrows_rows_per_sec': num_rows / iterrows,
+        'vectorized_rows_per_sec': num_rows / vectorized,
+        'chunked_rows_per_sec': num_rows / chunked,
+    }
+
+
+def benchmark_embed_scaling(num_rows=20000, max_workers=None):
+    """Embedding throughput of knowledge-base builds across 1..N worker processes"""
+    import os
+
+    texts, _ = embeddings.load_components(config.COMPONENTS_CSV)
+    texts = [f"{texts[i % len(texts)]} #{i}" for i in range(num_rows)]
+    model = embeddings.load_embedding_model(config.EMBEDDING_MODEL)
+    max_workers = max_workers or os.cpu_count()
+
+    counts = []
+    workers = 1
+    while workers < max_workers:
+        counts.append(workers)
+        workers *= 2
+    counts.append(max_workers)
+
+    report = {}
+    for workers in counts:
+        with embeddings.ParallelEncoder(model, workers=workers) as encoder:
+            start = time.perf_counter()
+            encoder.encode(texts)
+            report[workers] = num_rows / (time.perf_counter() - start)
+
+    print("\n" + "="*60)
+    print(f"EMBEDDING SCALING: {num_rows} texts, batch size {config.EMBEDDING_BATCH_SIZE}")
+    print("="*60)
+    for workers, rows_per_sec in report.items():
+        print(f"{workers:>3} workers {rows_per_sec:>10.0f} rows/sec  ({rows_per_sec / report[1]:.1f}x)")
+
+    return report
+
+
+def benchmark_token_batching(synthetic_rows=100000):
+    """Tokens/sec of row-count batches vs token-budget length-sorted batches"""
+    model = embeddings.load_embedding_model(config.EMBEDDING_MODEL)
+    shipped, _ = embeddings.load_components(config.COMPONENTS_CSV)
+
+    # Vary lengths widely: short names through long repeated descriptions
+    rng = np.random.default_rng(0)
+    synthetic = [
+        ' '.join([shipped[i % len(shipped)]] * int(rng.integers(1, 6)))[:int(rng.integers(20, 1500))]
+        for i in range(synthetic_rows)
+    ]
+
+    report = {}
+    for label, texts in (('shipped', shipped), (f"synthetic {synthetic_rows}", synthetic)):
+        tokens = int(embeddings.token_lengths(model, texts).sum())
+
+        start = time.perf_counter()
+        model.encode(texts, batch_size=config.EMBEDDING_BATCH_SIZE, convert_to_numpy=True)
+        rows_batched = tokens / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        embeddings.encode_by_token_budget(model, texts, config.EMBEDDING_TOKEN_BUDGET or 8192)
+        token_batched = tokens / (time.perf_counter() - start)
+
+        report[label] = {'row_batches_tokens_per_sec': rows_batched, 'token_budget_tokens_per_sec': token_batched}
+
+    print("\n" + "="*60)
+    print(f"TOKEN-BUDGET BATCHING (batch size {config.EMBEDDING_BATCH_SIZE} vs budget {config.EMBEDDING_TOKEN_BUDGET})")
+    print("="*60)
+    print(f"{'catalog':<20}{'rows tok/s':>14}{'budget tok/s':>14}")
+    for label, values in report.items():
+        print(f"{label:<20}{values['row_batches_tokens_per_sec']:>14.0f}{values['token_budget_tokens_per_sec']:>14.0f}")
+
+    return report
+
+
+PARITY_QUERIES = SAMPLE_QUERIES + [
+    'Design a photography portfolio with a gallery',
+    'Online store with product cards and a shopping cart',
+    'Admin dashboard with charts and a data table',
+    'Sign up form with date picker and file upload',
+    'Mail client with inbox list and message view',
+    'Documentation site with sidebar tree navigation',
+    'Pricing page with toggle between monthly and yearly',
+    'Settings page with switches, sliders and tabs',
+    'News site with article carousel and pagination',
+    'Kanban project board with progress bars',
+    'Restaurant landing page with menu and booking modal',
+    'Music player with play button and rating',
+    'Chat application with messaging and avatars',
+    'Rich text editor page with toolbar',
+    'Mega menu navigation for an enterprise site',
+]
+
+
+def benchmark_embedding_backends(top_k=None, repeats=50, min_agreement=0.9):
+    """Single-query encode latency and retrieval top-k parity of each backend vs float torch"""
+    top_k = top_k or config.TOP_K_RESULTS
+    index = vector_store.load_index(config.FAISS_INDEX_PATH)
+    metadata = embeddings.load_metadata(config.METADATA_PATH)
+
+    reference = None
+    report = {}
+    for backend in embeddings.EMBEDDING_BACKENDS:
+        model = embeddings.load_embedding_model(config.EMBEDDING_MODEL, backend)
+        loaded_backend = getattr(model, 'embedding_backend', backend)
+        if loaded_backend != backend:
+            # A fallback would only measure the reference model a second time
+            report[backend] = {'loaded_backend': loaded_backend, 'skipped': True}
+            continue
+        model.encode(PARITY_QUERIES[:1], convert_to_numpy=True)
+
+        latencies = []
+        for i in range(repeats):
+            query = PARITY_QUERIES[i % len(PARITY_QUERIES)]
+            start = time.perf_counter()
+            model.encode([query], convert_to_numpy=True)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        results = vector_store.search_many(PARITY_QUERIES, model, index, metadata, top_k=top_k)
+        ids = [{r['component_id'] for r in row} for row in results]
+        if reference is None:
+            reference = ids
+        agreement = sum(len(a & b) for a, b in zip(ids, reference)) / sum(len(b) for b in reference)
+        report[backend] = {'loaded_backend': loaded_backend, 'p50_ms': percentile(latencies, 50), 'topk_agreement': agreement}
+
+    print("\n" + "="*60)
+    print(f"EMBEDDING BACKENDS: {len(PARITY_QUERIES)} queries, top-{top_k} agreement vs torch")
+    print("="*60)
+    print(f"{'backend':<14}{'p50 ms':>10}{'speed-up':>10}{'agreement':>12}")
+    below = []
+    for backend, values in report.items():
+        if values.get('skipped'):
+            print(f"{backend:<14}{'skipped, loaded ' + values['loaded_backend']:>32}")
+            continue
+        speedup = report['torch']['p50_ms'] / values['p50_ms']
+        status = '✅' if values['topk_agreement'] >= min_agreement else '❌'
+        if values['topk_agreement'] < min_agreement:
+            below.append(backend)
+        print(f"{backend:<14}{values['p50_ms']:>10.2f}{speedup:>9.1f}x{values['topk_agreement']:>12.1%} {status}")
+    if below:
+        print(f"❌ Top-{top_k} agreement below {min_agreement:.0%} for: {', '.join(below)}")
+
+    report['regression'] = bool(below)
+    return report
+
+
+HEAVY_MODULES = ('torch', 'transformers', 'sentence_transformers', 'ctransformers', 'pandas', 'bs4', 'requests')
+
+
+def parse_importtime(stderr):
+    """Map top-level package -> cumulative microseconds from `-X importtime` output"""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, total, name = [part.strip() for part in line.split('|')]
+        package = name.split('.')[0]
+        cumulative[package] = max(cumulative.get(package, 0), int(total))
+    return cumulative
+
+
+def benchmark_import_time(module='main', runs=5, budget_ms=None):
+    """Cold `import main` time; flags a regression if heavy packages load or the budget is exceeded"""
+    budget_ms = budget_ms or config.IMPORT_TIME_BUDGET_MS
+    totals = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            cwd=config.BASE_DIR, capture_output=True, text=True, check=True
+        )
+        cumulative = parse_importtime(completed.stderr)
+        totals.append(cumulative[module] / 1000)
+
+    heavy = sorted(name for name in HEAVY_MODULES if name in cumulative)
+    slowest = sorted(cumulative.items(), key=lambda item: item[1], reverse=True)
+    report = {
+        'p50_ms': percentile(totals, 50),
+        'budget_ms': budget_ms,
+        'heavy_modules': heavy,
+        'slowest': [(name, us / 1000) for name, us in slowest if name != module][:8],
+    }
+    report['regression'] = bool(heavy) or report['p50_ms'] > budget_ms
+
+    print("\n" + "="*60)
+    print(f"IMPORT TIME: `import {module}` over {runs} cold interpreters")
+    print("="*60)
+    print(f"p50: {report['p50_ms']:.1f} ms (budget {budget_ms} ms)")
+    for name, ms in report['slowest']:
+        print(f"  {name:<24}{ms:>8.1f} ms")
+    if heavy:
+        print(f"❌ Heavy packages imported at startup: {', '.join(heavy)}")
+    elif report['regression']:
+        print("❌ Import time is over budget")
+    else:
+        print("✅ No heavy packages imported at startup")
+
+    return report
+
+
+BENCHMARKS = {
+    'session': benchmark_session,
+    'server': benchmark_server,
+    'search_many': benchmark_search_many,
+    'sections': benchmark_sections,
+    'query_cache': benchmark_query_cache,
+    'page_cache': benchmark_page_cache,
+    'streaming': benchmark_streaming,
+    'templates': benchmark_templates,
+    'fragments': benchmark_fragments,
+    'intent': benchmark_intent,
+    'llm': benchmark_llm,
+    'hybrid': benchmark_hybrid,
+    'ann': benchmark_ann,
+    'filtered': benchmark_filtered,
+    'mmr': benchmark_mmr,
+    'shards': benchmark_shards,
+    'metadata': benchmark_metadata,
+    'ingest': benchmark_ingest,
+    'embed_scaling': benchmark_embed_scaling,
+    'token_batching': benchmark_token_batching,
+    'embedding_backends': benchmark_embedding_backends,
+    'import_time': benchmark_import_time,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    regressions = []
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark: {name}. Available: {', '.join(BENCHMARKS)}")
+            sys.exit(1)
+        report = BENCHMARKS[name]()
+        if isinstance(report, dict) and report.get('regression'):
+            regressions.append(name)
+    if regressions:
+        print(f"\nRegressions in: {', '.join(regressions)}")
+        sys.exit(1)
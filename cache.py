@@ -0,0 +1,367 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+import config
+import fragments
+import generator
+
+
+GENERATOR_MODULES = [generator, fragments]
+_generator_version = None
+
+
+def normalize_query(text):
+    return ' '.join(str(text).lower().split())
+
+
+def key_hash(key):
+    """Non-zero 64-bit hash of a cache key; zero marks an empty slot"""
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little') or 1
+
+
+class EmbeddingCache:
+    """LRU cache of query embeddings in front of model.encode"""
+
+    def __init__(self, model, model_name, max_size=None, path=None):
+        self.model = model
+        self.model_name = model_name
+        self.max_size = max_size or config.QUERY_CACHE_SIZE
+        self.path = Path(path) if path is not None else None
+        self.lock_file = None
+        self.dimension = model.get_sentence_embedding_dimension()
+        self.slots = OrderedDict()
+        self.free_slots = list(range(self.max_size - 1, -1, -1))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+        # Vectors live in a fixed (max_size, dim) slab; with a path the slab is a
+        # memory-mapped .npy file and the key -> slot table a JSON sidecar.
+        # Slot writes reach the file immediately but the table only on save, so
+        # each slot also records the hash of its key in <path>.keys.npy and a
+        # table entry is only trusted on load if the hashes agree. Slots are
+        # allocated per process, so only one process (and one cache within it)
+        # may own the file; any other opener stays in memory
+        if self.path is not None and not self._acquire_ownership():
+            print(f"Query embedding cache at {self.path} is in use by another cache; using memory only")
+            self.path = None
+        if self.path is None:
+            self.vectors = np.zeros((self.max_size, self.dimension), dtype='float32')
+            self.key_hashes = np.zeros(self.max_size, dtype='uint64')
+        else:
+            self.vectors, self.key_hashes = self._open_persistent()
+            atexit.register(self.save)
+
+    def _acquire_ownership(self):
+        """Take a non-blocking exclusive lock on <path>.lock, held until the process exits"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.path.with_suffix('.lock'), 'a+')
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self.lock_file = lock_file
+        return True
+
+    def _keys_path(self):
+        return self.path.with_suffix('.json')
+
+    def _hashes_path(self):
+        return self.path.with_suffix('.keys.npy')
+
+    def _open_persistent(self):
+        shape = (self.max_size, self.dimension)
+        keys_path = self._keys_path()
+        hashes_path = self._hashes_path()
+        if self.path.exists() and keys_path.exists() and hashes_path.exists():
+            try:
+                with open(keys_path, 'r', encoding='utf-8') as f:
+                    stored = json.load(f)
+            except ValueError:
+                stored = {}
+            if stored.get('model_name') == self.model_name and tuple(stored.get('shape', ())) == shape:
+                vectors = np.load(self.path, mmap_mode='r+')
+                key_hashes = np.load(hashes_path, mmap_mode='r+')
+                dropped = 0
+                for key, slot in stored['slots']:
+                    # A slot reused after the table was last saved holds another key
+                    if key_hashes[slot] == key_hash(key):
+                        self.slots[key] = slot
+                    else:
+                        dropped += 1
+                used = set(self.slots.values())
+                self.free_slots = [s for s in self.free_slots if s not in used]
+                key_hashes[self.free_slots] = 0
+                print(f"Loaded {len(self.slots)} cached query embeddings from {self.path}"
+                      + (f" ({dropped} overwritten since the last save dropped)" if dropped else ""))
+                return vectors, key_hashes
+            print(f"Query embedding cache at {self.path} is stale (model, size or format changed), rebuilding")
+
+        vectors = np.lib.format.open_memmap(self.path, mode='w+', dtype='float32', shape=shape)
+        key_hashes = np.lib.format.open_memmap(hashes_path, mode='w+', dtype='uint64', shape=(self.max_size,))
+        return vectors, key_hashes
+
+    def save(self):
+        if self.path is None:
+            return
+        with self.lock:
+            self.vectors.flush()
+            self.key_hashes.flush()
+            tmp_path = self._keys_path().with_suffix('.json.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'model_name': self.model_name,
+                    'shape': [self.max_size, self.dimension],
+                    'slots': list(self.slots.items()),
+                }, f)
+            os.replace(tmp_path, self._keys_path())
+
+    def _store(self, key, vector):
+        if key in self.slots:
+            slot = self.slots[key]
+        elif self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            _, slot = self.slots.popitem(last=False)
+            self.evictions += 1
+        # Clear the slot's key before replacing its vector, so an interrupted
+        # write leaves an empty slot rather than a vector under the old key
+        self.key_hashes[slot] = 0
+        self.vectors[slot] = vector
+        self.key_hashes[slot] = key_hash(key)
+        self.slots[key] = slot
+
+    def encode(self, texts, convert_to_numpy=True, **kwargs):
+        """Drop-in replacement for model.encode on query texts"""
+        keys = [normalize_query(text) for text in texts]
+        output = np.empty((len(keys), self.dimension), dtype='float32')
+
+        with self.lock:
+            missing = {}
+            for i, key in enumerate(keys):
+                slot = self.slots.get(key)
+                if slot is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    self.slots.move_to_end(key)
+                    output[i] = self.vectors[slot]
+                    self.hits += 1
+
+        if missing:
+            new_keys = list(missing)
+            kwargs.pop('show_progress_bar', None)
+            new_vectors = self.model.encode(new_keys, convert_to_numpy=True, show_progress_bar=False, **kwargs)
+            with self.lock:
+                for key, vector in zip(new_keys, new_vectors):
+                    output[missing[key]] = vector
+                    self._store(key, vector)
+                    self.misses += len(missing[key])
+
+        return output
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self.slots),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
+def generator_version():
+    """Hash of the generator sources so cached pages expire when templates change"""
+    global _generator_version
+    if _generator_version is None:
+        digest = hashlib.sha256()
+        for module in GENERATOR_MODULES:
+            digest.update(Path(module.__file__).read_bytes())
+        _generator_version = digest.hexdigest()[:16]
+    return _generator_version
+
+
+def page_cache_key(user_query, retrieved_components, website_type=None, section_components=None, source='template'):
+    # The query is echoed into the page title and hero, so only surrounding
+    # whitespace is normalized; anything more would change the rendered HTML.
+    # Each component contributes its fragment digest so edited snippets miss
+    fragment_cache = fragments.get_fragment_cache()
+    components = ','.join(
+        f"{c['component_id']}:{fragment_cache.digest(c)}" for c in retrieved_components
+    )
+    sections = ';'.join(
+        f"{section}=" + ','.join(f"{c['component_id']}:{fragment_cache.digest(c)}" for c in section_results)
+        for section, section_results in sorted((section_components or {}).items())
+    )
+    raw = '\0'.join([generator_version(), source, user_query.strip(), components, website_type or '', sections])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class PageCache:
+    """Size-bounded LRU cache of rendered pages with an optional disk tier"""
+
+    def __init__(self, max_bytes=None, disk_dir=None, disk_max_bytes=None):
+        self.max_bytes = max_bytes or config.PAGE_CACHE_MAX_BYTES
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes or config.PAGE_CACHE_DISK_MAX_BYTES
+        self.pages = OrderedDict()
+        self.bytes = 0
+        self.disk_bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.lock = threading.Lock()
+
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self.disk_bytes = sum(p.stat().st_size for p in self.disk_dir.glob('*/*.html'))
+
+    def _disk_path(self, key):
+        return self.disk_dir / key[:2] / f"{key}.html"
+
+    def _remember(self, key, page):
+        if key in self.pages:
+            self.bytes -= len(self.pages.pop(key))
+        self.pages[key] = page
+        self.bytes += len(page)
+        while self.bytes > self.max_bytes and len(self.pages) > 1:
+            _, evicted = self.pages.popitem(last=False)
+            self.bytes -= len(evicted)
+
+    def get(self, key):
+        with self.lock:
+            page = self.pages.get(key)
+            if page is not None:
+                self.pages.move_to_end(key)
+                self.memory_hits += 1
+                self.bytes_saved += len(page)
+                return page.decode('utf-8')
+
+        if self.disk_dir is not None:
+            try:
+                page = self._disk_path(key).read_bytes()
+            except FileNotFoundError:
+                page = None
+            if page is not None:
+                with self.lock:
+                    self._remember(key, page)
+                    self.disk_hits += 1
+                    self.bytes_saved += len(page)
+                return page.decode('utf-8')
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, website_code):
+        page = website_code.encode('utf-8')
+        with self.lock:
+            self._remember(key, page)
+
+        if self.disk_dir is not None:
+            path = self._disk_path(key)
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+            tmp_path.write_bytes(page)
+            os.replace(tmp_path, path)
+            with self.lock:
+                self.disk_bytes += len(page)
+                over_budget = self.disk_bytes > self.disk_max_bytes
+            if over_budget:
+                self._prune_disk()
+
+    def _prune_disk(self):
+        # Drop the least recently written pages until the tier is at 90% of its budget
+        files = sorted(self.disk_dir.glob('*/*.html'), key=lambda p: p.stat().st_mtime)
+        total = sum(p.stat().st_size for p in files)
+        target = self.disk_max_bytes * 0.9
+        for path in files:
+            if total <= target:
+                break
+            total -= path.stat().st_size
+            path.unlink(missing_ok=True)
+        with self.lock:
+            self.disk_bytes = total
+
+    def stream(self, user_query, retrieved_components, website_type=None, section_components=None):
+        """Yield the page for this request: whole on a hit, section by section on a miss"""
+        if config.LLM_ENABLED:
+            yield self._llm_page(user_query, retrieved_components, website_type, section_components)
+            return
+        
+        key = page_cache_key(user_query, retrieved_components, website_type, section_components)
+        website_code = self.get(key)
+        if website_code is not None:
+            yield website_code
+            return
+        
+        chunks = []
+        for chunk in generator.iter_website_code(user_query, retrieved_components, website_type, section_components):
+            chunks.append(chunk)
+            yield chunk
+        # Only fully rendered pages are stored; an abandoned stream caches nothing
+        self.put(key, ''.join(chunks))
+
+    def _llm_page(self, user_query, retrieved_components, website_type=None, section_components=None):
+        key = page_cache_key(
+            user_query, retrieved_components, website_type, section_components, source=f"llm:{config.LLM_MODEL}"
+        )
+        website_code = self.get(key)
+        if website_code is not None:
+            return website_code
+        website_code = generator.llm_website_code(user_query, retrieved_components, section_components)
+        if website_code is None:
+            # Template fallbacks (model loading, over budget) are not stored, so
+            # the next request for this page gives the LLM another chance
+            print("✅ Using structured template generation for complete HTML")
+            return ''.join(generator.iter_structured_website(user_query, retrieved_components, website_type, section_components))
+        self.put(key, website_code)
+        return website_code
+
+    def generate(self, user_query, retrieved_components, website_type=None, section_components=None):
+        """Return the cached page for this request, rendering and storing it on a miss"""
+        return ''.join(self.stream(user_query, retrieved_components, website_type, section_components))
+
+    def stats(self):
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            'entries': len(self.pages),
+            'bytes': self.bytes,
+            'disk_bytes': self.disk_bytes,
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': hits / total if total else 0.0,
+            'bytes_saved': self.bytes_saved,
+        }
+
+
+_page_cache = None
+
+
+def get_page_cache():
+    """Return the process-wide page cache, creating it on first use"""
+    global _page_cache
+    if _page_cache is None:
+        _page_cache = PageCache(disk_dir=config.PAGE_CACHE_DIR if config.PAGE_CACHE_DISK else None)
+    return _page_cache
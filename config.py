@@ -10,13 +10,107 @@ EMBEDDINGS_DIR.mkdir(parents=True, exist_ok=True)
 
 COMPONENTS_CSV = PROCESSED_DATA_DIR / 'components.csv'
 FAISS_INDEX_PATH = EMBEDDINGS_DIR / 'components_index.faiss'
-METADATA_PATH = EMBEDDINGS_DIR / 'metadata.pkl'
+METADATA_PATH = EMBEDDINGS_DIR / 'metadata'
+MANIFEST_PATH = EMBEDDINGS_DIR / 'manifest.pkl'
+BM25_PATH = EMBEDDINGS_DIR / 'bm25'
 
 EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+# Query-time encoder: 'torch' (float), 'torch_int8' (dynamic quantization) or 'onnx'
+# (ONNX Runtime). Knowledge-base builds always use the float torch model.
+EMBEDDING_BACKEND = 'torch'
+INGEST_CHUNK_SIZE = 50000  # CSV rows read, encoded and indexed per chunk
+INGEST_TRAIN_SIZE = 200000  # rows held back to train streamed IVF indexes
+EMBEDDING_BATCH_SIZE = 64
+EMBEDDING_WORKERS = 1  # knowledge-base build encode processes; None uses every core
+EMBEDDING_TOKEN_BUDGET = 8192  # padded tokens per length-sorted batch; None batches by row count
+
+# Vector index: 'flat' (exact), 'hnsw', 'ivf_flat' or 'ivf_pq'
+INDEX_TYPE = 'flat'
+INDEX_METRIC = 'cosine'  # 'cosine' (inner product on normalized vectors) or legacy 'l2'
+INDEX_FP16 = False  # store vectors as float16 to halve index memory
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+IVF_NLIST = None  # None picks ~4 * sqrt(num_vectors)
+IVF_NPROBE = 8
+PQ_M = 16  # sub-quantizers; must divide the embedding dimension
+PQ_NBITS = 8
+# Large catalogs can be split into NUM_SHARDS indexes (by a hash of
+# component_id, or by category) that are built, saved and searched in parallel
+NUM_SHARDS = 1
+SHARD_BY = 'hash'  # 'hash' or 'category'
+SHARD_SEARCH_THREADS = None  # None uses one thread per shard
 
 LLM_MODEL = 'Qwen/Qwen2.5-Coder-3B-Instruct'
 LLM_FILE = None  
+# The LLM loads in the background on the first request; pages that cannot be
+# produced within LLM_LATENCY_BUDGET_S (including load time) use the template
+LLM_ENABLED = False
+LLM_LATENCY_BUDGET_S = 20.0
+LLM_THREADS = None  # None uses os.cpu_count()
+LLM_DTYPE = 'auto'  # 'auto', 'float32', 'bfloat16', 'float16' or 'int8'
+LLM_LOCAL_FILES_ONLY = False  # always True for a local checkpoint directory
+LLM_SNIPPET_CHARS = 600
 
 TOP_K_RESULTS = 5
+
+# Hybrid retrieval fuses the dense top HYBRID_CANDIDATES with the BM25 top
+# HYBRID_CANDIDATES by reciprocal rank fusion (score = sum 1 / (RRF_K + rank))
+HYBRID_SEARCH = True
+HYBRID_CANDIDATES = 50
+RRF_K = 60
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Highest-impact postings kept per term to seed the exact MaxScore search
+BM25_TOP_POSTINGS = 256
+
+# Maximal marginal relevance re-ranks the top MMR_CANDIDATES so near-duplicate
+# components (Button / Button Group) do not take several result slots;
+# MMR_LAMBDA = 1 is pure relevance, lower values favour diversity
+MMR_ENABLED = False
+MMR_LAMBDA = 0.7
+MMR_CANDIDATES = 20
+
+# Each page section (header, hero, footer) also runs its own sub-query in the
+# same batched search and gets up to SECTION_TOP_K components not used elsewhere
+SECTION_RETRIEVAL = True
+SECTION_TOP_K = 2
+
+# Filtered searches (e.g. category='Dashboard') run on an exact flat sub-index
+# of the matching vectors, built on first use and kept for the FILTER_CACHE_SIZE
+# most recent filters; larger subsets search the main index through an ID selector
+FILTER_SUBINDEX_MAX_SIZE = 50000
+FILTER_CACHE_SIZE = 64
+
+# Website type is predicted from the query embedding by nearest centroid over
+# the prototype prompts in INTENTS_PATH; below INTENT_MIN_SCORE the keyword
+# rules in generator.detect_website_type decide
+INTENTS_PATH = DATA_DIR / 'intents.json'
+INTENT_MIN_SCORE = 0.3
+
+QUERY_CACHE_SIZE = 10000
+QUERY_CACHE_PERSIST = True
+QUERY_CACHE_PATH = EMBEDDINGS_DIR / 'query_cache.npy'
+
+# Cards rendered at request time for components outside the metadata store
+FRAGMENT_CACHE_SIZE = 1024
+
+PAGE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+PAGE_CACHE_DISK = True
+PAGE_CACHE_DIR = DATA_DIR / 'page_cache'
+PAGE_CACHE_DISK_MAX_BYTES = 1024 * 1024 * 1024
 MAX_TOKENS = 2048
-TEMPERATURE = 0.7
\ No newline at end of file
+TEMPERATURE = 0.7
+
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 8000
+SERVER_MAX_TOP_K = 50
+BATCH_MAX_SIZE = 32
+BATCH_MAX_WAIT_MS = 5
+
+BATCH_OUTPUT_DIR = BASE_DIR / 'generated' / 'batch'
+BATCH_RETRIEVE_SIZE = 256
+BATCH_WORKERS = None  # None uses os.cpu_count()
+
+# Cold-start budget for `import main`, checked by `python benchmark.py import_time`
+IMPORT_TIME_BUDGET_MS = 400
@@ -1,12 +1,49 @@
-import pandas as pd
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import pickle
+import hashlib
+import json
+import mmap
+import os
+import shutil
+from pathlib import Path
 
+import config
 
-def load_embedding_model(model_name):
-    print(f"Loading embedding model: {model_name}")
-    model = SentenceTransformer(model_name)
+
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS')
+
+
+EMBEDDING_BACKENDS = ('torch', 'torch_int8', 'onnx')
+
+
+def load_embedding_model(model_name, backend='torch'):
+    print(f"Loading embedding model: {model_name} ({backend})")
+    # Imported here so that modules which only search or render do not pay
+    # the torch/transformers import cost
+    from sentence_transformers import SentenceTransformer
+    
+    # The backend that actually loaded is recorded on the model, since onnx
+    # falls back to torch when its extras are missing
+    if backend == 'torch':
+        model = SentenceTransformer(model_name)
+    elif backend == 'torch_int8':
+        import torch
+        model = SentenceTransformer(model_name, device='cpu')
+        # Dynamic quantization swaps every Linear layer for an int8 kernel;
+        # activations stay float, so no calibration data is needed
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif backend == 'onnx':
+        try:
+            model = SentenceTransformer(model_name, device='cpu', backend='onnx')
+        except (ImportError, TypeError, ValueError) as e:
+            # Needs sentence-transformers>=3.2 with optimum[onnxruntime]
+            print(f"⚠️ ONNX backend unavailable ({e}); falling back to torch")
+            model = SentenceTransformer(model_name)
+            backend = 'torch'
+    else:
+        raise ValueError(f"Unknown embedding backend: {backend}. Choose from {', '.join(EMBEDDING_BACKENDS)}")
+
+    model.embedding_backend = backend
     return model
 
 
@@ -15,40 +52,323 @@ def create_text_from_row(row):
     return text
 
 
-def create_embeddings_from_csv(csv_path, model):
+def create_texts_from_frame(df):
+    """Vectorized create_text_from_row over whole columns"""
+    # map(str) formats empty cells as 'nan' exactly like the f-string in
+    # create_text_from_row; astype(str) keeps them NaN on pandas 3
+    text = (
+        df['name'].map(str) + ' - ' + df['category'].map(str) + '. '
+        + df['description'].map(str) + '. Use cases: ' + df['use_cases'].map(str)
+    )
+    return text.tolist()
+
+
+def components_from_frame(df):
+    # Empty cells become '' so 'nan' never reaches BM25 tokens or snippet cards
+    records = df[METADATA_FIELDS].astype(object)
+    records = records.where(records.notna(), '')
+    return create_texts_from_frame(df), records.to_dict('records')
+
+
+def load_components(csv_path):
+    import pandas as pd
+    
     print(f"Loading components from {csv_path}")
     df = pd.read_csv(csv_path)
+    return components_from_frame(df)
+
+
+def count_components(csv_path, chunk_size=None):
+    """Row count of a components CSV, reading only the component_id column"""
+    import pandas as pd
     
-    texts = []
-    metadata = []
+    # Snippets contain quoted newlines, so counting lines would overcount
+    return sum(
+        len(df) for df in pd.read_csv(csv_path, usecols=['component_id'], chunksize=chunk_size or config.INGEST_CHUNK_SIZE)
+    )
+
+
+def iter_component_chunks(csv_path, chunk_size=None):
+    """Stream (texts, metadata) chunks so catalogs larger than RAM can be ingested"""
+    import pandas as pd
     
-    for _, row in df.iterrows():
-        text = create_text_from_row(row)
-        texts.append(text)
+    print(f"Streaming components from {csv_path}")
+    for df in pd.read_csv(csv_path, chunksize=chunk_size or config.INGEST_CHUNK_SIZE):
+        yield components_from_frame(df)
+
+
+class ParallelEncoder:
+    """Shard model.encode across a pool of CPU worker processes"""
+
+    def __init__(self, model, workers=None, batch_size=None):
+        self.model = model
+        self.workers = workers or config.EMBEDDING_WORKERS or os.cpu_count()
+        self.batch_size = batch_size or config.EMBEDDING_BATCH_SIZE
+        self.pool = None
+        if self.workers > 1:
+            # Split the cores between workers so their torch thread pools do
+            # not oversubscribe the machine; spawned children read these on import
+            threads = str(max(1, (os.cpu_count() or 1) // self.workers))
+            saved = {name: os.environ.get(name) for name in THREAD_ENV_VARS}
+            os.environ.update({name: threads for name in THREAD_ENV_VARS})
+            try:
+                self.pool = model.start_multi_process_pool(target_devices=['cpu'] * self.workers)
+            finally:
+                for name, value in saved.items():
+                    if value is None:
+                        os.environ.pop(name, None)
+                    else:
+                        os.environ[name] = value
+            print(f"Started {self.workers} embedding workers ({threads} threads each)")
+
+    def encode(self, texts, show_progress_bar=False, convert_to_numpy=True, **kwargs):
+        batch_size = kwargs.pop('batch_size', self.batch_size)
+        if self.pool is None or len(texts) < batch_size * self.workers:
+            if config.EMBEDDING_TOKEN_BUDGET:
+                return encode_by_token_budget(self.model, texts, config.EMBEDDING_TOKEN_BUDGET, **kwargs)
+            return self.model.encode(texts, batch_size=batch_size, show_progress_bar=show_progress_bar, convert_to_numpy=True, **kwargs)
         
-        metadata_item = {
-            'component_id': row['component_id'],
-            'name': row['name'],
-            'category': row['category'],
-            'description': row['description'],
-            'code_snippet': row['code_snippet'],
-            'use_cases': row['use_cases']
-        }
-        metadata.append(metadata_item)
-    
+        # Sorting by length makes each chunk handed to a worker length-homogeneous
+        order = np.argsort(token_lengths(self.model, texts), kind='stable')
+        vectors = self.model.encode_multi_process([texts[i] for i in order], self.pool, batch_size=batch_size)
+        output = np.empty_like(vectors)
+        output[order] = vectors
+        return output
+
+    def get_sentence_embedding_dimension(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    def close(self):
+        if self.pool is not None:
+            self.model.stop_multi_process_pool(self.pool)
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def token_lengths(model, texts):
+    """Token count of each text after truncation to the model's max sequence length"""
+    tokenizer = getattr(model, 'tokenizer', None)
+    if tokenizer is None:
+        return np.array([len(text.split()) for text in texts], dtype='int64')
+    max_length = getattr(model, 'max_seq_length', None) or 512
+    encoded = tokenizer(list(texts), add_special_tokens=True, truncation=True, max_length=max_length)
+    return np.array([len(ids) for ids in encoded['input_ids']], dtype='int64')
+
+
+def token_budget_batches(lengths, token_budget):
+    """Group indices (shortest first) so each padded batch stays within token_budget"""
+    order = np.argsort(lengths, kind='stable')
+    batches = []
+    start = 0
+    for end in range(1, len(order) + 1):
+        # Batches are padded to their longest (last) member
+        if end == len(order) or lengths[order[end]] * (end + 1 - start) > token_budget:
+            batches.append(order[start:end])
+            start = end
+    return batches
+
+
+def encode_by_token_budget(model, texts, token_budget, **kwargs):
+    """Encode length-homogeneous batches sized by padded tokens, restoring input order"""
+    lengths = token_lengths(model, texts)
+    output = None
+    for batch in token_budget_batches(lengths, token_budget):
+        vectors = model.encode(
+            [texts[i] for i in batch],
+            batch_size=len(batch),
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            **kwargs
+        )
+        if output is None:
+            output = np.empty((len(texts), vectors.shape[1]), dtype=vectors.dtype)
+        output[batch] = vectors
+    if output is None:
+        return np.zeros((0, model.get_sentence_embedding_dimension()), dtype='float32')
+    return output
+
+
+def encode_texts(texts, model, workers=None, batch_size=None):
     print(f"Creating embeddings for {len(texts)} components...")
-    embeddings = model.encode(texts, show_progress_bar=True, convert_to_numpy=True)
+    with ParallelEncoder(model, workers=workers, batch_size=batch_size) as encoder:
+        return encoder.encode(texts, show_progress_bar=True)
+
+
+def create_embeddings_from_csv(csv_path, model):
+    texts, metadata = load_components(csv_path)
+    embeddings = encode_texts(texts, model)
     
     return embeddings, metadata
 
 
-def save_metadata(metadata, path):
-    with open(path, 'wb') as f:
-        pickle.dump(metadata, f)
-    print(f"Saved metadata to {path}")
+def hash_text(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+METADATA_FIELDS = ['component_id', 'name', 'category', 'description', 'code_snippet', 'use_cases']
+
+
+def _to_text(value):
+    # Empty CSV cells come back from pandas as NaN
+    if value is None or (isinstance(value, float) and value != value):
+        return ''
+    return str(value)
+
+
+class MetadataRow(dict):
+    """A metadata record that remembers the store slot it was read from"""
+
+    def __init__(self, *args, slot=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.slot = slot
+
+    def with_fields(self, **fields):
+        return MetadataRow(self, slot=self.slot, **fields)
+
+
+class ColumnarMetadata:
+    """Memory-mapped, read-only metadata store that materializes rows on access"""
+
+    # Each field is a contiguous UTF-8 blob; a single (rows + 1, fields) int64
+    # offsets array locates every value, so opening the store costs the same
+    # for any catalog size
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / 'columns.json', 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        self.fields = info['fields']
+        # Derived columns written alongside the rows (e.g. rendered snippet
+        # cards) are read with value() and left out of materialized rows
+        self.row_fields = info.get('row_fields', self.fields)
+        self.row_columns = [self.fields.index(field) for field in self.row_fields]
+        self.count = info['count']
+        # Plain ndarray views over the maps skip np.memmap's per-slice overhead
+        self.present = np.load(self.path / 'present.npy', mmap_mode='r').view(np.ndarray)
+        self.offsets = np.load(self.path / 'offsets.npy', mmap_mode='r').view(np.ndarray)
+        self.blobs = [self._map_blob(self.path / f'{field}.blob') for field in self.fields]
+
+    @staticmethod
+    def _map_blob(blob_path):
+        if not blob_path.stat().st_size:
+            return b''
+        with open(blob_path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.count
+
+    def value(self, index, field):
+        column = self.fields.index(field)
+        start, end = self.offsets[index:index + 2, column].tolist()
+        return self.blobs[column][start:end].decode('utf-8')
+
+    def column(self, field):
+        """One field's value for every row (None for freed slots), decoded in one pass"""
+        column = self.fields.index(field)
+        bounds = self.offsets[:, column].tolist()
+        blob = self.blobs[column]
+        return [
+            blob[bounds[i]:bounds[i + 1]].decode('utf-8') if present else None
+            for i, present in enumerate(self.present.tolist())
+        ]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        if not self.present[index]:
+            return None
+        starts, ends = self.offsets[index:index + 2].tolist()
+        return MetadataRow({
+            field: self.blobs[column][starts[column]:ends[column]].decode('utf-8')
+            for field, column in zip(self.row_fields, self.row_columns)
+        }, slot=index)
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+    def to_list(self):
+        return list(self)
+
+
+class MetadataWriter:
+    """Append metadata rows chunk by chunk into a columnar store"""
+
+    def __init__(self, path, extra_fields=()):
+        self.path = Path(path)
+        self.tmp_path = self.path.with_name(self.path.name + '.tmp')
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        self.tmp_path.mkdir(parents=True)
+        self.extra_fields = list(extra_fields)
+        self.fields = METADATA_FIELDS + self.extra_fields
+        self.blobs = [open(self.tmp_path / f'{field}.blob', 'wb') for field in self.fields]
+        self.ends = np.zeros(len(self.fields), dtype='int64')
+        self.offsets = [self.ends[None, :].copy()]
+        self.present = []
+        self.count = 0
+
+    def append(self, metadata, extra=None):
+        """extra holds one column of strings per extra field, aligned with metadata"""
+        columns = [
+            [_to_text(item[field]) if item is not None else '' for item in metadata]
+            for field in METADATA_FIELDS
+        ]
+        columns += extra or [[''] * len(metadata) for _ in self.extra_fields]
+        lengths = np.zeros((len(metadata), len(self.fields)), dtype='int64')
+        for column, (values, blob) in enumerate(zip(columns, self.blobs)):
+            encoded = [value.encode('utf-8') for value in values]
+            lengths[:, column] = [len(value) for value in encoded]
+            blob.write(b''.join(encoded))
+        offsets = self.ends + np.cumsum(lengths, axis=0)
+        if len(offsets):
+            self.ends = offsets[-1]
+        self.offsets.append(offsets)
+        self.present.append(np.array([item is not None for item in metadata], dtype='uint8'))
+        self.count += len(metadata)
+
+    def close(self):
+        for blob in self.blobs:
+            blob.close()
+        np.save(self.tmp_path / 'offsets.npy', np.concatenate(self.offsets))
+        np.save(self.tmp_path / 'present.npy', np.concatenate(self.present) if self.present else np.zeros(0, dtype='uint8'))
+        with open(self.tmp_path / 'columns.json', 'w', encoding='utf-8') as f:
+            json.dump({'fields': self.fields, 'row_fields': METADATA_FIELDS, 'count': self.count}, f)
+        
+        # Swap directories so open readers keep their (unlinked) memory maps
+        old_path = self.path.with_name(self.path.name + '.old')
+        shutil.rmtree(old_path, ignore_errors=True)
+        if self.path.exists():
+            self.path.rename(old_path)
+        self.tmp_path.rename(self.path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        print(f"Saved metadata to {self.path}")
+
+
+def save_metadata(metadata, path, extra_fields=(), extra=None):
+    writer = MetadataWriter(path, extra_fields)
+    writer.append(metadata, extra)
+    writer.close()
 
 
 def load_metadata(path):
-    with open(path, 'rb') as f:
+    path = Path(path)
+    if path.is_dir():
+        return ColumnarMetadata(path)
+    
+    # Convert a pickled metadata list from older builds on first load
+    legacy_path = path if path.suffix == '.pkl' else path.with_suffix('.pkl')
+    with open(legacy_path, 'rb') as f:
         metadata = pickle.load(f)
-    return metadata
\ No newline at end of file
+    if legacy_path != path:
+        print(f"Converting pickled metadata at {legacy_path} to a columnar store")
+        save_metadata(metadata, path)
+        legacy_path.unlink()
+        return ColumnarMetadata(path)
+    return metadata
@@ -0,0 +1,230 @@
+import html
+import re
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
+from pathlib import Path
+
+import config
+from embeddings import ColumnarMetadata, hash_text
+
+
+# Snippets come from the scraped catalog and are embedded verbatim into pages,
+# so they are re-serialized through an allowlist once when the card is built.
+# Anything not listed is dropped: unknown tags keep their text, the tags below
+# lose their content as well
+SNIPPET_TAGS = {
+    'a', 'b', 'blockquote', 'br', 'button', 'code', 'div', 'em', 'fieldset', 'figcaption', 'figure',
+    'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'i', 'img', 'input', 'label',
+    'legend', 'li', 'main', 'nav', 'ol', 'optgroup', 'option', 'p', 'pre', 'section', 'select', 'small',
+    'span', 'strong', 'table', 'tbody', 'td', 'textarea', 'tfoot', 'th', 'thead', 'tr', 'ul',
+    'svg', 'path', 'circle', 'rect', 'line', 'polyline', 'polygon', 'g',
+}
+SNIPPET_DROP_CONTENT = {'script', 'style', 'iframe', 'object', 'embed', 'template', 'noscript', 'frameset', 'frame'}
+SNIPPET_VOID_TAGS = {'br', 'hr', 'img', 'input'}
+SNIPPET_ATTRS = {
+    'alt', 'checked', 'class', 'cols', 'colspan', 'contenteditable', 'disabled', 'for', 'height', 'href',
+    'id', 'max', 'min', 'name', 'placeholder', 'role', 'rows', 'rowspan', 'selected', 'src', 'step',
+    'style', 'title', 'type', 'value', 'width',
+    'clip-rule', 'cx', 'cy', 'd', 'fill', 'fill-rule', 'points', 'r', 'rx', 'ry', 'stroke',
+    'stroke-linecap', 'stroke-linejoin', 'stroke-width', 'viewbox', 'x', 'x1', 'x2', 'xmlns', 'y', 'y1', 'y2',
+}
+SNIPPET_URL_ATTRS = {'href', 'src'}
+SAFE_URL_SCHEMES = {'http', 'https', 'mailto', 'tel'}
+URL_SCHEME = re.compile(r'^([a-z][a-z0-9+.-]*):')
+UNSAFE_STYLE = re.compile(r'expression|url\s*\(|javascript:|@import', re.IGNORECASE)
+
+
+def safe_url(value):
+    # Attribute values arrive entity-decoded; browsers also ignore embedded
+    # whitespace and control characters when reading the scheme
+    compact = re.sub(r'[\x00-\x20\x7f]+', '', value).lower()
+    match = URL_SCHEME.match(compact)
+    return match is None or match.group(1) in SAFE_URL_SCHEMES
+
+
+class SnippetSanitizer(HTMLParser):
+    """Re-serialize a snippet keeping only allowlisted tags and attributes"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self.open_tags = []
+        self.skip_depth = 0
+
+    def _attrs(self, attrs):
+        kept = []
+        for name, value in attrs:
+            if not (name in SNIPPET_ATTRS or name.startswith(('aria-', 'data-'))):
+                continue
+            if value is None:
+                kept.append(f' {name}')
+                continue
+            if name in SNIPPET_URL_ATTRS and not safe_url(value):
+                continue
+            if name == 'style' and UNSAFE_STYLE.search(value):
+                continue
+            kept.append(f' {name}="{html.escape(value, quote=True)}"')
+        return ''.join(kept)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SNIPPET_DROP_CONTENT:
+            self.skip_depth += 1
+            return
+        if self.skip_depth or tag not in SNIPPET_TAGS:
+            return
+        self.out.append(f'<{tag}{self._attrs(attrs)}>')
+        if tag not in SNIPPET_VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if self.skip_depth or tag not in SNIPPET_TAGS:
+            return
+        self.out.append(f'<{tag}{self._attrs(attrs)}{"" if tag in SNIPPET_VOID_TAGS else f"></{tag}"}>')
+
+    def handle_endtag(self, tag):
+        if tag in SNIPPET_DROP_CONTENT:
+            self.skip_depth = max(0, self.skip_depth - 1)
+            return
+        # Stray closing tags are dropped and unclosed ones closed, so a snippet
+        # can never break out of its card
+        if self.skip_depth or tag not in self.open_tags:
+            return
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.out.append(f'</{open_tag}>')
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.out.append(html.escape(data, quote=False))
+
+    def result(self):
+        self.close()
+        return ''.join(self.out) + ''.join(f'</{tag}>' for tag in reversed(self.open_tags))
+
+
+def sanitize_snippet(snippet):
+    sanitizer = SnippetSanitizer()
+    sanitizer.feed(snippet)
+    return sanitizer.result()
+
+
+# Bump when card rendering or sanitizing changes so stored cards are rebuilt
+FRAGMENT_VERSION = 2
+
+
+def fragment_digest(component):
+    fields = [str(component.get(field) or '') for field in ('name', 'category', 'code_snippet')]
+    return hash_text('\0'.join([str(FRAGMENT_VERSION)] + fields))
+
+
+def render_component_card(component):
+    """Escaped name/category around the sanitized live snippet"""
+    return f'''            <div class="bg-white rounded-lg shadow-md p-6" data-component-id="{html.escape(str(component['component_id']))}">
+                <h3 class="text-xl font-bold text-gray-800 mb-1">{html.escape(str(component.get('name') or ''))}</h3>
+                <p class="text-sm text-gray-500 mb-4">{html.escape(str(component.get('category') or ''))}</p>
+                <div class="component-preview">{sanitize_snippet(str(component.get('code_snippet') or ''))}</div>
+            </div>
+'''
+
+
+# Cards are stored as extra columns of the columnar metadata store, so a
+# request reads only the rows it renders
+FRAGMENT_FIELDS = ['card_digest', 'card']
+
+
+def open_card_store(metadata_path):
+    """The columnar metadata store at metadata_path if it holds rendered cards, else None"""
+    path = Path(metadata_path)
+    if not (path / 'columns.json').exists():
+        return None
+    store = ColumnarMetadata(path)
+    return store if 'card' in store.fields else None
+
+
+def card_columns(metadata, previous=None):
+    """[digests, cards] columns for metadata, copying unchanged cards from a previous store"""
+    digests, cards = [], []
+    for item in metadata:
+        if item is None:
+            digests.append('')
+            cards.append('')
+            continue
+        digest = fragment_digest(item)
+        # Builds keep each component's slot, so the previous card is checked
+        # at that slot and reused only if its digest still matches
+        slot = getattr(item, 'slot', None)
+        if previous is not None and slot is not None and slot < len(previous) \
+                and previous.value(slot, 'card_digest') == digest:
+            card = previous.value(slot, 'card')
+        else:
+            card = render_component_card(item)
+        digests.append(digest)
+        cards.append(card)
+    return [digests, cards]
+
+
+class FragmentCache:
+    """Rendered component cards, read from the metadata store by slot"""
+
+    def __init__(self, metadata_path=None, max_size=None):
+        self.store = open_card_store(metadata_path) if metadata_path is not None else None
+        self.max_size = max_size or config.FRAGMENT_CACHE_SIZE
+        # Components that did not come from the store (or whose stored card
+        # is out of date) are rendered on first use and kept in a small LRU
+        self.rendered = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def entry(self, component):
+        digest = fragment_digest(component)
+        slot = getattr(component, 'slot', None)
+        if self.store is not None and slot is not None and slot < len(self.store) \
+                and self.store.value(slot, 'card_digest') == digest:
+            self.hits += 1
+            return digest, self.store.value(slot, 'card')
+
+        key = (component['component_id'], digest)
+        with self.lock:
+            card = self.rendered.get(key)
+            if card is not None:
+                self.rendered.move_to_end(key)
+                self.hits += 1
+                return digest, card
+        card = render_component_card(component)
+        with self.lock:
+            self.rendered[key] = card
+            if len(self.rendered) > self.max_size:
+                self.rendered.popitem(last=False)
+            self.misses += 1
+        return digest, card
+
+    def digest(self, component):
+        return fragment_digest(component)
+
+    def cards(self, components):
+        return ''.join(self.entry(component)[1] for component in components)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'stored': len(self.store) if self.store is not None else 0,
+            'rendered': len(self.rendered),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
+_fragment_cache = None
+
+
+def get_fragment_cache():
+    """Return the process-wide fragment cache, opening the card store on first use"""
+    global _fragment_cache
+    if _fragment_cache is None:
+        _fragment_cache = FragmentCache(config.METADATA_PATH)
+    return _fragment_cache
@@ -1,6 +1,24 @@
+import html
+import os
+import threading
+import time
+from pathlib import Path
+
 import config
-import torch
-from ctransformers import LLM
+import fragments
+
+
+def llm_torch_dtype(torch):
+    """Resolve LLM_DTYPE ('auto', 'float32', 'bfloat16', 'float16' or 'int8') to a load dtype"""
+    if config.LLM_DTYPE == 'auto':
+        if torch.cuda.is_available():
+            return torch.float16
+        # bf16 halves memory traffic on CPUs with native bf16 (AVX512-BF16/AMX)
+        bf16_supported = getattr(torch.backends.mkldnn, 'is_bf16_supported', lambda: False)
+        return torch.bfloat16 if bf16_supported() else torch.float32
+    if config.LLM_DTYPE == 'int8':
+        return torch.float32
+    return getattr(torch, config.LLM_DTYPE)
 
 
 def load_llm_model():
@@ -9,50 +27,220 @@ def load_llm_model():
         print("Loading LLM model...")
         print(f"Model: {config.LLM_MODEL}")
         
-        if config.LLM_MODEL.startswith('Qwen/'):
-            print("Using Qwen model via transformers...")
-            from transformers import AutoTokenizer, AutoModelForCausalLM
-            tokenizer = AutoTokenizer.from_pretrained(
-                config.LLM_MODEL,
-                trust_remote_code=True
-            )
-            dtype = torch.float16 if (hasattr(torch, 'cuda') and torch.cuda.is_available()) else torch.float32
-            model = AutoModelForCausalLM.from_pretrained(
-                config.LLM_MODEL,
-                trust_remote_code=True,
-                torch_dtype=dtype,
-                device_map='auto',
-                low_cpu_mem_usage=True
-            )
-            return {'tokenizer': tokenizer, 'model': model, 'type': 'qwen'}
-        else:
-            from transformers import AutoTokenizer, AutoModelForCausalLM
-            tokenizer = AutoTokenizer.from_pretrained(config.LLM_MODEL)
-            model = AutoModelForCausalLM.from_pretrained(config.LLM_MODEL)
-            return {'tokenizer': tokenizer, 'model': model, 'type': 'transformers'}
+        # torch/transformers are only imported when an LLM is actually loaded,
+        # so the template path and CLI start without them
+        import torch
+        from transformers import AutoTokenizer, AutoModelForCausalLM
+        
+        torch.set_num_threads(config.LLM_THREADS or os.cpu_count() or 1)
+        dtype = llm_torch_dtype(torch)
+        # A local checkpoint directory never touches the network
+        local_files_only = config.LLM_LOCAL_FILES_ONLY or Path(config.LLM_MODEL).is_dir()
+        options = {'trust_remote_code': config.LLM_MODEL.startswith('Qwen/'), 'local_files_only': local_files_only}
+        
+        tokenizer = AutoTokenizer.from_pretrained(config.LLM_MODEL, **options)
+        model = AutoModelForCausalLM.from_pretrained(
+            config.LLM_MODEL,
+            torch_dtype=dtype,
+            low_cpu_mem_usage=True,
+            device_map='auto' if torch.cuda.is_available() else None,
+            **options
+        )
+        if config.LLM_DTYPE == 'int8' and not torch.cuda.is_available():
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        model.eval()
+        
+        print(f"LLM ready ({dtype}, {torch.get_num_threads()} threads)")
+        return {
+            'tokenizer': tokenizer,
+            'model': model,
+            'type': 'qwen' if config.LLM_MODEL.startswith('Qwen/') else 'transformers',
+        }
             
     except Exception as e:
         print(f"⚠️ Failed to load LLM model: {e}")
         return None
 
 
-def create_structured_website(user_query, retrieved_components):
-    """Create a complete, structured website using template + components"""
+_llm = None
+_llm_loader = None
+_llm_loaded = threading.Event()
+_llm_lock = threading.Lock()
+# One generate() at a time; concurrent requests wait within their budget
+_llm_generate_lock = threading.Lock()
+
+
+def _load_llm():
+    global _llm
+    try:
+        _llm = load_llm_model()
+    finally:
+        _llm_loaded.set()
+
+
+def get_llm(timeout=0):
+    """Start loading the LLM on first call; return it once loaded, else None
+
+    Loading runs in a background thread, so requests that arrive while the
+    model is still loading fall back to the template instead of blocking.
+    """
+    global _llm_loader
+    with _llm_lock:
+        if _llm_loader is None:
+            _llm_loader = threading.Thread(target=_load_llm, daemon=True)
+            _llm_loader.start()
+    _llm_loaded.wait(timeout)
+    return _llm
+
+
+def build_llm_prompt(user_query, retrieved_components, tokenizer=None):
+    components = '\n\n'.join(
+        f"{c['name']} ({c['category']}): {c['description']}\n{str(c.get('code_snippet') or '')[:config.LLM_SNIPPET_CHARS]}"
+        for c in retrieved_components
+    )
+    instructions = (
+        "You are a web developer. Write one complete, single-file HTML5 page using Tailwind CSS "
+        "(https://cdn.tailwindcss.com) for the request below. Reuse the provided components where "
+        "they fit. Output only HTML, starting with <!DOCTYPE html> and ending with </html>."
+    )
+    request = f"Request: {user_query}\n\nComponents:\n{components}"
+    if tokenizer is not None and getattr(tokenizer, 'chat_template', None):
+        return tokenizer.apply_chat_template(
+            [{'role': 'system', 'content': instructions}, {'role': 'user', 'content': request}],
+            tokenize=False,
+            add_generation_prompt=True
+        )
+    return f"{instructions}\n\n{request}\n\n<!DOCTYPE html>"
+
+
+def iter_llm_tokens(llm, prompt, deadline, max_new_tokens=None):
+    """Yield decoded text as the model produces it, stopping at the deadline"""
+    import queue
+    from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
     
-    query_lower = user_query.lower()
+    class DeadlineCriteria(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            return stop.is_set() or time.perf_counter() >= deadline
     
-    if any(word in query_lower for word in ['portfolio', 'resume', 'cv']):
-        website_type = 'portfolio'
-    elif any(word in query_lower for word in ['blog', 'article', 'news']):
-        website_type = 'blog'
-    elif any(word in query_lower for word in ['shop', 'store', 'ecommerce', 'product']):
-        website_type = 'ecommerce'
-    elif any(word in query_lower for word in ['landing', 'marketing', 'startup']):
-        website_type = 'landing'
-    else:
-        website_type = 'general'
+    tokenizer, model = llm['tokenizer'], llm['model']
+    stop = threading.Event()
+    inputs = tokenizer(prompt, return_tensors='pt').to(model.device)
+    streamer = TextIteratorStreamer(
+        tokenizer,
+        skip_prompt=True,
+        skip_special_tokens=True,
+        timeout=max(deadline - time.perf_counter(), 0.001)
+    )
+    worker = threading.Thread(target=model.generate, daemon=True, kwargs={
+        **inputs,
+        'streamer': streamer,
+        'max_new_tokens': max_new_tokens or config.MAX_TOKENS,
+        'do_sample': config.TEMPERATURE > 0,
+        'temperature': config.TEMPERATURE if config.TEMPERATURE > 0 else None,
+        'stopping_criteria': StoppingCriteriaList([DeadlineCriteria()]),
+        'pad_token_id': tokenizer.pad_token_id or tokenizer.eos_token_id,
+    })
+    worker.start()
+    try:
+        for text in streamer:
+            yield text
+    except queue.Empty:
+        # No token arrived before the deadline (e.g. a long prefill)
+        pass
+    finally:
+        # generate() stops at its next step; waiting for it keeps the caller's
+        # one-at-a-time lock held until the model is actually free
+        stop.set()
+        worker.join()
+
+
+def extract_html(text):
+    """The complete HTML document in the model output, or None if it is incomplete"""
+    lower = text.lower()
+    start = lower.find('<!doctype html')
+    if start < 0:
+        start = lower.find('<html')
+    end = lower.rfind('</html>')
+    if start < 0 or end < start:
+        return None
+    return text[start:end + len('</html>')]
+
+
+def generate_with_llm(user_query, retrieved_components, budget_s=None):
+    """LLM page within the latency budget, or None so the caller uses the template"""
+    start = time.perf_counter()
+    deadline = start + (config.LLM_LATENCY_BUDGET_S if budget_s is None else budget_s)
     
-    html = f'''<!DOCTYPE html>
+    llm = get_llm(timeout=max(deadline - time.perf_counter(), 0))
+    if llm is None:
+        return None
+    if not _llm_generate_lock.acquire(timeout=max(deadline - time.perf_counter(), 0)):
+        return None
+    try:
+        prompt = build_llm_prompt(user_query, retrieved_components, llm['tokenizer'])
+        # The prompt asks for a document that starts with the doctype; plain
+        # (non-chat) prompts already end with it, so it is added back here
+        text = '' if getattr(llm['tokenizer'], 'chat_template', None) else '<!DOCTYPE html>'
+        tokens = 0
+        pieces = iter_llm_tokens(llm, prompt, deadline)
+        try:
+            for piece in pieces:
+                text += piece
+                tokens += 1
+                if '</html>' in text[-len(piece) - len('</html>'):].lower():
+                    break
+        finally:
+            pieces.close()
+    finally:
+        _llm_generate_lock.release()
+    
+    elapsed = time.perf_counter() - start
+    page = extract_html(text)
+    if page is None:
+        reason = 'over its latency budget' if time.perf_counter() >= deadline else 'returned incomplete HTML'
+        print(f"⚠️ LLM {reason} after {elapsed:.1f}s ({tokens} chunks)")
+        return None
+    print(f"✅ LLM page in {elapsed:.1f}s ({tokens} chunks)")
+    return page
+
+
+WEBSITE_TYPE_KEYWORDS = (
+    ('portfolio', ('portfolio', 'resume', 'cv')),
+    ('blog', ('blog', 'article', 'news')),
+    ('ecommerce', ('shop', 'store', 'ecommerce', 'product')),
+    ('landing', ('landing', 'marketing', 'startup')),
+)
+
+
+def detect_website_type(user_query):
+    query_lower = user_query.lower()
+    for website_type, keywords in WEBSITE_TYPE_KEYWORDS:
+        for word in keywords:
+            if word in query_lower:
+                return website_type
+    return 'general'
+
+
+# Besides the prompt itself (which feeds the main content), every page section
+# retrieves components for its own sub-query in the same batched search
+SECTION_QUERIES = (
+    ('header', 'navigation menu for {query}'),
+    ('hero', 'hero banner for {query}'),
+    ('footer', 'footer for {query}'),
+)
+
+
+def section_queries(user_query):
+    return [template.format(query=user_query) for _, template in SECTION_QUERIES]
+
+
+def iter_page_sections(website_type, user_query, retrieved_components, components_section=None, section_html=None):
+    """Build each page section from the create_* functions (source of PAGE_TEMPLATES)
+
+    user_query is inserted as is, so it must already be HTML-escaped.
+    """
+    section_html = section_html or {}
+    yield f'''<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
@@ -63,19 +251,60 @@ def create_structured_website(user_query, retrieved_components):
 <body class="bg-gray-50">
 '''
     
-    html += create_header(website_type, retrieved_components)
+    yield create_header(website_type, retrieved_components) + section_html.get('header', '')
     
-    html += create_hero(website_type, user_query, retrieved_components)
+    yield create_hero(website_type, user_query, retrieved_components) + section_html.get('hero', '')
     
-    html += create_main_content(website_type, retrieved_components)
+    yield from iter_main_content(website_type, retrieved_components, components_section)
     
-    html += create_footer(website_type, retrieved_components)
+    yield section_html.get('footer', '') + create_footer(website_type, retrieved_components)
     
-    html += '''
+    yield '''
 </body>
 </html>'''
-    
-    return html
+
+
+# Slot values of a page with nothing retrieved; requests copy these and only
+# render the slots they have components for
+EMPTY_PAGE_VALUES = {'components': '', **{f'{section}_components': '' for section, _ in SECTION_QUERIES}}
+
+
+def page_values(user_query, retrieved_components, section_components=None):
+    # Cards come pre-rendered from the fragment cache, so filling the
+    # components slots is a lookup and a join per component
+    # The prompt is echoed into the title and hero of a text/html response
+    values = dict(EMPTY_PAGE_VALUES, query=html.escape(user_query))
+    if not retrieved_components and not section_components:
+        return values
+    fragment_cache = fragments.get_fragment_cache()
+    if retrieved_components:
+        values['components'] = create_components_section(fragment_cache.cards(retrieved_components))
+    for section, components in (section_components or {}).items():
+        if components:
+            values[f'{section}_components'] = create_section_components(section, fragment_cache.cards(components))
+    return values
+
+
+def resolve_website_type(user_query, website_type=None):
+    """Use a classified website type when it has a template, else the keyword rules"""
+    if website_type in PAGE_TEMPLATES:
+        return website_type
+    return detect_website_type(user_query)
+
+
+def iter_structured_website(user_query, retrieved_components, website_type=None, section_components=None):
+    """Yield the page section by section so callers can stream it as it renders"""
+    values = page_values(user_query, retrieved_components, section_components)
+    for fragment in PAGE_TEMPLATES[resolve_website_type(user_query, website_type)]:
+        yield render_fragment(fragment, values)
+
+
+def create_structured_website(user_query, retrieved_components, website_type=None, section_components=None):
+    """Create a complete, structured website using template + components"""
+    return render_fragment(
+        PAGE_DOCUMENTS[resolve_website_type(user_query, website_type)],
+        page_values(user_query, retrieved_components, section_components)
+    )
 
 
 def create_header(website_type, components):
@@ -162,21 +391,57 @@ def create_hero(website_type, query, components):
     return hero
 
 
-def create_main_content(website_type, components):
-    """Create main content sections with retrieved components"""
-    content = '<main class="container mx-auto px-6 py-12">\n'
+def iter_main_content(website_type, components, components_section=None):
+    """Yield main content sections with retrieved components"""
+    if components_section is None:
+        components_section = create_components_section(fragments.get_fragment_cache().cards(components))
+    
+    yield '<main class="container mx-auto px-6 py-12">\n'
     
     if website_type == 'portfolio':
-        content += create_portfolio_sections(components)
+        yield create_portfolio_sections(components)
     elif website_type == 'blog':
-        content += create_blog_sections(components)
+        yield create_blog_sections(components)
     elif website_type == 'ecommerce':
-        content += create_ecommerce_sections(components)
+        yield create_ecommerce_sections(components)
     else:
-        content += create_general_sections(components)
+        yield create_general_sections(components)
+    
+    yield components_section
     
-    content += '</main>\n'
-    return content
+    yield '</main>\n'
+
+
+def create_main_content(website_type, components):
+    """Create main content sections with retrieved components"""
+    return ''.join(iter_main_content(website_type, components))
+
+
+def create_components_section(cards_html):
+    """Lay out the retrieved components' cards; empty when nothing was retrieved"""
+    if not cards_html:
+        return ''
+    return f'''
+    <!-- Retrieved Components -->
+    <section id="components" class="mb-16">
+        <h2 class="text-3xl font-bold text-gray-800 mb-6">Featured Components</h2>
+        <div class="grid grid-cols-1 md:grid-cols-2 gap-8">
+{cards_html}        </div>
+    </section>
+'''
+
+
+def create_section_components(section, cards_html):
+    """Cards retrieved for one page section's sub-query; empty when it has none"""
+    if not cards_html:
+        return ''
+    return f'''
+    <!-- {section.title()} Components -->
+    <section data-section="{section}" class="container mx-auto px-6 py-8">
+        <div class="grid grid-cols-1 md:grid-cols-2 gap-8">
+{cards_html}        </div>
+    </section>
+'''
 
 
 def create_portfolio_sections(components):
@@ -506,13 +771,87 @@ def create_footer(website_type, components):
 '''
 
 
-def generate_website_code(user_query, retrieved_components):
-    """Main function to generate complete website code"""
+def llm_website_code(user_query, retrieved_components, section_components=None):
+    """LLM page drawing on the main and section components, or None to use the template"""
+    section_components = section_components or {}
+    all_components = list(retrieved_components) + [c for cs in section_components.values() for c in cs]
+    return generate_with_llm(user_query, all_components)
+
+
+def iter_website_code(user_query, retrieved_components, website_type=None, section_components=None):
+    """Streaming form of generate_website_code: yields page chunks in order"""
+    section_components = section_components or {}
+    all_components = list(retrieved_components) + [c for cs in section_components.values() for c in cs]
     print(f"\nGenerating website for: {user_query}")
-    print(f"Using {len(retrieved_components)} relevant components\n")
+    print(f"Using {len(all_components)} relevant components\n")
     
-    # Always use structured generation for complete output
-    print("✅ Using structured template generation for complete HTML")
-    html_code = create_structured_website(user_query, retrieved_components)
+    if config.LLM_ENABLED:
+        page = llm_website_code(user_query, retrieved_components, section_components)
+        if page is not None:
+            yield page
+            return
     
-    return html_code
\ No newline at end of file
+    # Structured generation guarantees complete output
+    print("✅ Using structured template generation for complete HTML")
+    yield from iter_structured_website(user_query, retrieved_components, website_type, section_components)
+
+
+def generate_website_code(user_query, retrieved_components, website_type=None, section_components=None):
+    """Main function to generate complete website code"""
+    return ''.join(iter_website_code(user_query, retrieved_components, website_type, section_components))
+
+
+# Precompiled templates: every section is rendered once at import with slot
+# markers in place of the per-request values, then split into static text and
+# slot names, so a request only joins precomputed strings
+WEBSITE_TYPES = ('portfolio', 'blog', 'ecommerce', 'landing', 'general')
+SLOT_MARKER = '\0'
+
+
+def slot(name):
+    return f'{SLOT_MARKER}{name}{SLOT_MARKER}'
+
+
+def compile_fragment(text):
+    """Split text into a tuple alternating static strings (even) and slot names (odd)"""
+    return tuple(text.split(SLOT_MARKER))
+
+
+def render_fragment(fragment, values):
+    if len(fragment) == 1:
+        return fragment[0]
+    parts = list(fragment)
+    for i in range(1, len(parts), 2):
+        parts[i] = values[parts[i]]
+    return ''.join(parts)
+
+
+def compile_page_templates():
+    return {
+        website_type: tuple(
+            compile_fragment(section)
+            for section in iter_page_sections(
+                website_type, slot('query'), [], slot('components'),
+                {name: slot(f'{name}_components') for name, _ in SECTION_QUERIES}
+            )
+        )
+        for website_type in WEBSITE_TYPES
+    }
+
+
+def compile_page_documents(templates):
+    """Whole-page fragments with adjacent static text merged, for non-streaming renders"""
+    return {
+        website_type: compile_fragment(''.join(render_fragment(f, SLOT_NAMES) for f in fragments))
+        for website_type, fragments in templates.items()
+    }
+
+
+class _SlotNames(dict):
+    def __missing__(self, name):
+        return slot(name)
+
+
+SLOT_NAMES = _SlotNames()
+PAGE_TEMPLATES = compile_page_templates()
+PAGE_DOCUMENTS = compile_page_documents(PAGE_TEMPLATES)
@@ -0,0 +1,56 @@
+import json
+
+import numpy as np
+
+import config
+
+
+def load_prototypes(path):
+    """Read {type: {"layout": ..., "prompts": [...]}} from the intents file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        prototypes = json.load(f)
+    return {
+        label: {'layout': spec.get('layout', label), 'prompts': list(spec['prompts'])}
+        for label, spec in prototypes.items()
+    }
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype='float32')
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class IntentClassifier:
+    """Nearest-centroid website type classifier over query embeddings
+
+    Each type's centroid is the mean of its normalized prototype prompt
+    embeddings, so classifying a query already embedded for retrieval is one
+    (types x dim) matrix product. New types only need an entry in the intents file.
+    """
+
+    def __init__(self, model, path=None, min_score=None):
+        self.path = path or config.INTENTS_PATH
+        self.min_score = config.INTENT_MIN_SCORE if min_score is None else min_score
+        prototypes = load_prototypes(self.path)
+        self.labels = list(prototypes)
+        self.layouts = {label: prototypes[label]['layout'] for label in self.labels}
+
+        centroids = []
+        for label in self.labels:
+            vectors = normalize_rows(model.encode(prototypes[label]['prompts'], convert_to_numpy=True))
+            centroids.append(vectors.mean(axis=0))
+        self.centroids = normalize_rows(np.vstack(centroids))
+
+    def predict(self, query_embeddings):
+        """(label, cosine score) of the nearest centroid for each query vector"""
+        scores = normalize_rows(query_embeddings).reshape(-1, self.centroids.shape[1]) @ self.centroids.T
+        best = scores.argmax(axis=1)
+        return [(self.labels[i], float(scores[row, i])) for row, i in enumerate(best)]
+
+    def classify(self, query_embeddings):
+        """Layout name per query, or None when no centroid is close enough"""
+        return [
+            self.layouts[label] if score >= self.min_score else None
+            for label, score in self.predict(query_embeddings)
+        ]
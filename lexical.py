@@ -0,0 +1,256 @@
+import json
+import re
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+import config
+
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+# The name is counted twice so a verbatim component name outranks passing
+# mentions of the same words in descriptions
+LEXICAL_FIELDS = ('name', 'name', 'category', 'description', 'use_cases')
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+def document_text(item):
+    return ' '.join(str(item.get(field) or '') for field in LEXICAL_FIELDS)
+
+
+# Version of the on-disk postings layout; indexes written with another one
+# are ignored until the knowledge base is rebuilt
+BM25_LAYOUT = 2
+
+
+class BM25Writer:
+    """Accumulate documents chunk by chunk and write a BM25 index in CSR form"""
+
+    def __init__(self, path, k1=None, b=None, top_postings=None):
+        self.path = Path(path)
+        self.k1 = config.BM25_K1 if k1 is None else k1
+        self.b = config.BM25_B if b is None else b
+        self.top_postings = top_postings or config.BM25_TOP_POSTINGS
+        self.vocab = {}
+        self.terms = []
+        self.doc_ids = []
+        self.freqs = []
+        self.lengths = []
+
+    def append(self, metadata):
+        """Add documents in slot order; None rows (freed slots) stay empty"""
+        vocab = self.vocab
+        token_ids = []
+        token_docs = []
+        for item in metadata:
+            doc = len(self.lengths)
+            if item is None:
+                self.lengths.append(0)
+                continue
+            ids = [vocab.setdefault(token, len(vocab)) for token in tokenize(document_text(item))]
+            self.lengths.append(len(ids))
+            token_ids.extend(ids)
+            token_docs.extend([doc] * len(ids))
+        if not token_ids:
+            return
+        # Term frequencies for the whole chunk in one pass over (doc, term) keys
+        keys, freqs = np.unique(
+            np.array(token_docs, dtype='int64') << 32 | np.array(token_ids, dtype='int64'),
+            return_counts=True
+        )
+        self.doc_ids.append((keys >> 32).astype('int32'))
+        self.terms.append((keys & 0xFFFFFFFF).astype('int64'))
+        self.freqs.append(freqs.astype('float32'))
+
+    def close(self):
+        terms = np.concatenate(self.terms) if self.terms else np.zeros(0, dtype='int64')
+        docs = np.concatenate(self.doc_ids) if self.doc_ids else np.zeros(0, dtype='int32')
+        freqs = np.concatenate(self.freqs) if self.freqs else np.zeros(0, dtype='float32')
+        lengths = np.array(self.lengths, dtype='float32')
+        num_docs = int((lengths > 0).sum())
+        avgdl = float(lengths[lengths > 0].mean()) if num_docs else 0.0
+
+        offsets = np.zeros(len(self.vocab) + 1, dtype='int64')
+        np.cumsum(np.bincount(terms, minlength=len(self.vocab)), out=offsets[1:])
+
+        # Store each posting's full BM25 contribution (idf x saturated tf), so a
+        # query only sums precomputed impacts; float16 keeps postings at 6 bytes
+        doc_freq = np.diff(offsets).astype('float32')
+        idf = np.log1p((num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+        norm = self.k1 * (1 - self.b + self.b * lengths[docs] / max(avgdl, 1e-9))
+        impacts = (idf[terms] * freqs * (self.k1 + 1) / (freqs + norm)).astype('float16')
+
+        # Each term's postings form one slice ordered by doc id, so a document's
+        # impact is found by binary search. Every term also keeps, as a separate
+        # small CSR block, its top_postings highest impact postings, which seed a
+        # query's threshold, and the largest impact left outside that block
+        order = np.lexsort((docs, terms))
+        terms, docs, impacts = terms[order], docs[order], impacts[order]
+        by_impact = np.lexsort((docs, -impacts.astype('float32'), terms))
+        rank = np.arange(len(terms)) - offsets[terms[by_impact]]
+        top = by_impact[rank < self.top_postings]
+        rest = by_impact[rank == self.top_postings]
+        rest_maxima = np.zeros(len(self.vocab), dtype='float32')
+        rest_maxima[terms[rest]] = impacts[rest]
+        top_offsets = np.zeros(len(self.vocab) + 1, dtype='int64')
+        np.cumsum(np.minimum(np.diff(offsets), self.top_postings), out=top_offsets[1:])
+
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        tmp_path.mkdir(parents=True)
+        np.save(tmp_path / 'offsets.npy', offsets)
+        np.save(tmp_path / 'docs.npy', docs)
+        np.save(tmp_path / 'impacts.npy', impacts)
+        np.save(tmp_path / 'rest_maxima.npy', rest_maxima)
+        np.save(tmp_path / 'top_offsets.npy', top_offsets)
+        np.save(tmp_path / 'top_docs.npy', docs[top])
+        np.save(tmp_path / 'top_impacts.npy', impacts[top])
+        vocab = sorted(self.vocab, key=self.vocab.get)
+        with open(tmp_path / 'bm25.json', 'w', encoding='utf-8') as f:
+            json.dump({
+                'layout': BM25_LAYOUT, 'k1': self.k1, 'b': self.b, 'num_docs': num_docs, 'num_slots': len(lengths), 'avgdl': avgdl, 'vocab': vocab,
+            }, f)
+
+        shutil.rmtree(self.path, ignore_errors=True)
+        tmp_path.rename(self.path)
+        print(f"Saved BM25 index to {self.path} ({len(vocab)} terms, {len(docs)} postings)")
+
+
+def build_bm25(metadata, path):
+    writer = BM25Writer(path)
+    writer.append(metadata)
+    writer.close()
+
+
+class BM25Index:
+    """Memory-mapped BM25 postings scored by summing precomputed impacts"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / 'bm25.json', 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        self.num_docs = info['num_docs']
+        self.num_slots = info['num_slots']
+        self.vocab = {term: i for i, term in enumerate(info['vocab'])}
+        self.offsets = np.load(self.path / 'offsets.npy', mmap_mode='r').view(np.ndarray)
+        self.docs = np.load(self.path / 'docs.npy', mmap_mode='r').view(np.ndarray)
+        self.impacts = np.load(self.path / 'impacts.npy', mmap_mode='r').view(np.ndarray)
+        self.rest_maxima = np.load(self.path / 'rest_maxima.npy', mmap_mode='r').view(np.ndarray)
+        self.top_offsets = np.load(self.path / 'top_offsets.npy', mmap_mode='r').view(np.ndarray)
+        self.top_docs = np.load(self.path / 'top_docs.npy', mmap_mode='r').view(np.ndarray)
+        self.top_impacts = np.load(self.path / 'top_impacts.npy', mmap_mode='r').view(np.ndarray)
+
+    def score(self, term_ids, docs):
+        """Exact BM25 scores of the given sorted doc ids, one binary search per term"""
+        scores = np.zeros(len(docs), dtype='float32')
+        for t in term_ids:
+            postings = self.docs[self.offsets[t]:self.offsets[t + 1]]
+            positions = np.searchsorted(postings, docs).clip(max=len(postings) - 1)
+            hit = postings[positions] == docs
+            scores[hit] += self.impacts[self.offsets[t] + positions[hit]].astype('float32')
+        return scores
+
+    def search(self, query_text, top_k=10, allowed=None):
+        """(doc ids, scores) of the exact BM25 top_k documents, best first
+
+        MaxScore over the query terms: the top-impact postings of every term
+        are scored first, and their k-th best score is a threshold. A document
+        outside that seed gains at most rest_maxima[t] from each term, so terms
+        whose rest_maxima together cannot reach the threshold are never
+        scanned, only probed for the candidates the other terms produce.
+        allowed, a sorted id array, restricts every candidate set before
+        scoring, so filtered searches stay exact.
+        """
+        term_ids = sorted({self.vocab[t] for t in tokenize(query_text) if t in self.vocab})
+        if not term_ids:
+            return np.zeros(0, dtype='int64'), np.zeros(0, dtype='float32')
+
+        def restrict(docs):
+            if allowed is None:
+                return docs
+            positions = np.searchsorted(allowed, docs).clip(max=max(len(allowed) - 1, 0))
+            return docs[allowed[positions] == docs] if len(allowed) else docs[:0]
+
+        lengths = {t: int(self.offsets[t + 1] - self.offsets[t]) for t in term_ids}
+        # Lists no longer than their top block are already complete in the seed
+        long_terms = [t for t in term_ids if lengths[t] > self.top_offsets[t + 1] - self.top_offsets[t]]
+        if allowed is not None and len(allowed) <= sum(lengths[t] for t in long_terms):
+            # A small filter is cheaper to score directly than any list scan
+            candidates = np.asarray(allowed, dtype='int32')
+        else:
+            seed = restrict(np.unique(np.concatenate([
+                self.top_docs[self.top_offsets[t]:self.top_offsets[t + 1]] for t in term_ids
+            ])))
+            candidates = seed
+            if long_terms:
+                scores = self.score(term_ids, seed)
+                threshold = np.partition(scores, len(scores) - top_k)[len(scores) - top_k] if len(scores) >= top_k else 0.0
+                # Terms are non-essential, in increasing order of rest_maxima,
+                # while those sum to at most the threshold: an unseeded document
+                # found only in those lists cannot enter the top k
+                bound = 0.0
+                essential = []
+                for t in sorted(long_terms, key=lambda t: self.rest_maxima[t]):
+                    bound += float(self.rest_maxima[t])
+                    if bound > threshold:
+                        essential.append(t)
+                if 4 * sum(lengths[t] for t in essential) * len(term_ids) >= sum(lengths.values()):
+                    # A binary search probe costs about four sequential postings,
+                    # so summing every list outright is cheaper here
+                    return self.exhaustive(term_ids, top_k, allowed)
+                if essential:
+                    marked = np.zeros(self.num_slots, dtype=bool)
+                    marked[seed] = True
+                    for t in essential:
+                        marked[restrict(self.docs[self.offsets[t]:self.offsets[t + 1]])] = True
+                    candidates = np.flatnonzero(marked)
+
+        return self.top(candidates, self.score(term_ids, candidates), top_k)
+
+    def exhaustive(self, term_ids, top_k, allowed=None):
+        """Top_k by summing every posting of the terms into a dense score array"""
+        scores = np.zeros(self.num_slots, dtype='float32')
+        for t in term_ids:
+            start, end = self.offsets[t], self.offsets[t + 1]
+            scores += np.bincount(
+                self.docs[start:end], weights=self.impacts[start:end], minlength=self.num_slots
+            ).astype('float32')
+        candidates = np.arange(self.num_slots) if allowed is None else np.asarray(allowed, dtype='int64')
+        return self.top(candidates, scores[candidates], top_k)
+
+    @staticmethod
+    def top(candidates, scores, top_k):
+        matched = scores > 0
+        candidates, scores = candidates[matched], scores[matched]
+        k = min(top_k, len(candidates))
+        if not k:
+            return np.zeros(0, dtype='int64'), np.zeros(0, dtype='float32')
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return candidates[top].astype('int64'), scores[top]
+
+
+def load_bm25(path):
+    path = Path(path)
+    if not (path / 'bm25.json').exists():
+        return None
+    with open(path / 'bm25.json', 'r', encoding='utf-8') as f:
+        layout = json.load(f).get('layout')
+    if layout != BM25_LAYOUT:
+        print(f"BM25 index at {path} uses an older layout; lexical search is off until `python main.py --rebuild`")
+        return None
+    return BM25Index(path)
+
+
+def reciprocal_rank_fusion(rankings, k=None):
+    """Fuse ranked id lists: score(d) = sum over rankings of 1 / (k + rank)"""
+    k = config.RRF_K if k is None else k
+    fused = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, 1):
+            fused[doc] = fused.get(doc, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -1,12 +1,14 @@
+import argparse
 import config
 import scraper
 import embeddings
 import vector_store
-import generator
+import batch
+import session as gen_session
 from pathlib import Path
 
 
-def setup_knowledge_base():
+def setup_knowledge_base(full_rebuild=False):
     print("="*60)
     print("STEP 1: Setting up Knowledge Base")
     print("="*60)
@@ -25,90 +27,121 @@ def setup_knowledge_base():
     # Load embedding model
     model = embeddings.load_embedding_model(config.EMBEDDING_MODEL)
     
-    # Create embeddings
-    emb_vectors, metadata = embeddings.create_embeddings_from_csv(
-        config.COMPONENTS_CSV, 
-        model
-    )
+    # Reuse stored vectors for unchanged rows when a compatible build exists
+    if not full_rebuild and vector_store.can_update_incrementally(
+        config.FAISS_INDEX_PATH,
+        config.MANIFEST_PATH,
+        config.EMBEDDING_MODEL
+    ):
+        print("\n" + "="*60)
+        print("STEP 3: Updating Vector Database Incrementally")
+        print("="*60)
+        
+        texts, metadata = embeddings.load_components(config.COMPONENTS_CSV)
+        with embeddings.ParallelEncoder(model) as encoder:
+            vector_store.update_vector_database(
+                texts,
+                metadata,
+                encoder,
+                config.FAISS_INDEX_PATH,
+                config.METADATA_PATH,
+                config.MANIFEST_PATH,
+                bm25_path=config.BM25_PATH
+            )
+        print("\n✅ Knowledge base update complete!\n")
+        return
     
     print("\n" + "="*60)
     print("STEP 3: Building Vector Database")
     print("="*60)
     
-    # Build and save FAISS index
-    vector_store.build_vector_database(
-        emb_vectors,
-        metadata,
-        config.FAISS_INDEX_PATH,
-        config.METADATA_PATH
-    )
+    # Stream CSV chunks straight into the encoder and the FAISS index
+    with embeddings.ParallelEncoder(model) as encoder:
+        vector_store.build_vector_database_streaming(
+            embeddings.iter_component_chunks(config.COMPONENTS_CSV),
+            encoder,
+            config.FAISS_INDEX_PATH,
+            config.METADATA_PATH,
+            manifest_path=config.MANIFEST_PATH,
+            model_name=config.EMBEDDING_MODEL,
+            bm25_path=config.BM25_PATH,
+            num_rows=embeddings.count_components(config.COMPONENTS_CSV)
+        )
     
     print("\n✅ Knowledge base setup complete!\n")
 
 
-def generate_website(user_query):
-    print("="*60)
-    print("STEP 1: Loading Vector Database")
+def generate_website(user_query, session=None):
     print("="*60)
-    
-    index = vector_store.load_index(config.FAISS_INDEX_PATH)
-    metadata = embeddings.load_metadata(config.METADATA_PATH)
-    
-    print("\n" + "="*60)
-    print("STEP 2: Loading Embedding Model")
+    print("STEP 1: Preparing Generator Session")
     print("="*60)
     
-    model = embeddings.load_embedding_model(config.EMBEDDING_MODEL)
+    # The session loads the index, metadata and embedding model once and
+    # keeps them resident for every later query
+    if session is None:
+        session = gen_session.get_session()
     
     print("\n" + "="*60)
-    print("STEP 3: Retrieving Relevant Components")
+    print("STEP 2: Retrieving Components and Generating Website Code")
     print("="*60)
     
-    results = vector_store.search_similar_components(
-        user_query,
-        model,
-        index,
-        metadata,
-        top_k=config.TOP_K_RESULTS
-    )
+    chunks, results, timings = session.stream(user_query)
     
     print(f"\nFound {len(results)} relevant components:")
     for i, result in enumerate(results, 1):
         print(f"  {i}. {result['name']} (Score: {result['similarity_score']:.3f})")
     
-    print("\n" + "="*60)
-    print("STEP 4: Generating Website Code")
-    print("="*60)
-    
-    # Generate website
-    website_code = generator.generate_website_code(user_query, results)
-    
-    # Save generated website
+    # Save generated website, writing each section as soon as it renders
     output_dir = config.BASE_DIR / 'generated'
     output_dir.mkdir(exist_ok=True)
     
     output_file = output_dir / 'website.html'
+    parts = []
     with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(website_code)
+        for chunk in chunks:
+            f.write(chunk)
+            parts.append(chunk)
+    website_code = ''.join(parts)
     
     print(f"\n✅ Website generated successfully!")
     print(f"📄 Saved to: {output_file}")
-    print(f"🌐 Open the file in your browser to view the website\n")
+    print(f"🌐 Open the file in your browser to view the website")
+    print(f"⏱️  {gen_session.format_latency_report(timings, session)}\n")
     
     return website_code, output_file
 
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='RAG website generator')
+    parser.add_argument('--batch', metavar='JSONL', help='Generate a page for every request in a JSONL file')
+    parser.add_argument('--output-dir', default=None, help='Output directory for --batch pages')
+    parser.add_argument('--workers', type=int, default=None, help='Generation worker processes for --batch')
+    parser.add_argument('--rebuild', action='store_true', help='Update the knowledge base, re-embedding only changed components')
+    parser.add_argument('--full-rebuild', action='store_true', help='Re-embed every component and rebuild the index from scratch')
+    parser.add_argument('--migrate-index', action='store_true', help='Convert an existing L2 index to the configured cosine index')
+    args = parser.parse_args(argv)
+    
     print("\n" + "="*60)
     print("     RAG WEBSITE GENERATOR")
     print("="*60 + "\n")
     
-    if not config.FAISS_INDEX_PATH.exists():
+    if args.migrate_index:
+        vector_store.migrate_index(config.FAISS_INDEX_PATH, config.MANIFEST_PATH)
+    
+    if args.rebuild or args.full_rebuild:
+        setup_knowledge_base(full_rebuild=args.full_rebuild)
+    elif not vector_store.index_exists(config.FAISS_INDEX_PATH):
         print("Knowledge base not found. Setting up...")
         setup_knowledge_base()
     else:
         print("Knowledge base found. Skipping setup.\n")
     
+    if args.batch:
+        batch.run_batch(args.batch, output_dir=args.output_dir, workers=args.workers)
+        return
+    
+    session = gen_session.get_session()
+    
     while True:
         print("\n" + "-"*60)
         user_query = input("\nEnter your website request (or 'quit' to exit):\n> ").strip()
@@ -121,7 +154,7 @@ def main():
             print("Please enter a valid request.")
             continue
         
-        website_code, output_file = generate_website(user_query)
+        website_code, output_file = generate_website(user_query, session)
         
         print("\n" + "-"*60)
         print("Want to generate another website? Enter a new request or 'quit'")
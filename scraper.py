@@ -1,8 +1,3 @@
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
-
-
 def create_all_keep_design_components():
     """
     Create comprehensive component database with all 49 Keep Design components
@@ -424,6 +419,8 @@ def create_all_keep_design_components():
 
 def scrape_and_save(output_path):
     """Create and save the comprehensive Keep Design component database"""
+    import pandas as pd
+    
     print("Creating comprehensive Keep Design component database...")
     components = create_all_keep_design_components()
     df = pd.DataFrame(components)
@@ -0,0 +1,249 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+import session as gen_session
+import vector_store
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+class QueryBatcher:
+    """Collect concurrent retrieval requests and serve them with one batched search"""
+
+    def __init__(self, session, max_batch_size=None, max_wait_ms=None):
+        self.session = session
+        self.max_batch_size = max_batch_size or config.BATCH_MAX_SIZE
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else config.BATCH_MAX_WAIT_MS) / 1000
+        self.pending = queue.Queue()
+        self.batches = 0
+        self.batched_queries = 0
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def submit(self, user_query, top_k, filters=None):
+        future = Future()
+        self.pending.put((user_query, top_k, filters, future))
+        return future
+
+    def analyze(self, user_query, top_k=None, filters=None):
+        """(results, website type, section components) for one query, served from a shared batch"""
+        return self.submit(user_query, top_k or config.TOP_K_RESULTS, filters).result()
+
+    def retrieve(self, user_query, top_k=None, filters=None):
+        return self.analyze(user_query, top_k, filters)[0]
+
+    def _collect(self):
+        batch = [self.pending.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Requests with the same filter share a search over the same subset
+            groups = {}
+            for item in batch:
+                groups.setdefault(vector_store.filter_key(item[2]), []).append(item)
+            for group in groups.values():
+                self._run_group(group)
+            self.batches += 1
+            self.batched_queries += len(batch)
+
+    def _run_group(self, group):
+        queries = [item[0] for item in group]
+        top_ks = [item[1] for item in group]
+        try:
+            all_results, website_types, all_sections = self.session.analyze_many(queries, top_k=top_ks, filters=group[0][2])
+        except Exception as e:
+            for *_, future in group:
+                future.set_exception(e)
+            return
+
+        for (*_, future), results, website_type, sections in zip(group, all_results, website_types, all_sections):
+            future.set_result((results, website_type, sections))
+
+
+class LatencyTracker:
+    def __init__(self, window=10000):
+        self.samples = {}
+        self.window = window
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, elapsed_ms):
+        with self.lock:
+            self.samples.setdefault(endpoint, deque(maxlen=self.window)).append(elapsed_ms)
+
+    def summary(self):
+        with self.lock:
+            return {
+                endpoint: {
+                    'count': len(values),
+                    'p50_ms': percentile(values, 50),
+                    'p99_ms': percentile(values, 99),
+                }
+                for endpoint, values in self.samples.items()
+            }
+
+
+class GenerationRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'RAGWebsiteGenerator/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_request(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        if not isinstance(payload, dict):
+            raise ValueError('body must be a JSON object')
+        user_query = payload.get('query', '')
+        if not isinstance(user_query, str):
+            raise ValueError('"query" must be a string')
+        user_query = user_query.strip()
+        top_k = int(payload.get('top_k') or config.TOP_K_RESULTS)
+        # A batch searches with the largest top_k among its queries, so one
+        # oversized request would slow every query grouped with it
+        if not 1 <= top_k <= config.SERVER_MAX_TOP_K:
+            raise ValueError(f'"top_k" must be between 1 and {config.SERVER_MAX_TOP_K}')
+        # {"filters": {"category": ["Dashboard", "UI Components"]}}, or "category" alone
+        filters = dict(payload.get('filters') or {})
+        if payload.get('category'):
+            filters['category'] = payload['category']
+        vector_store.filter_key(filters)
+        return user_query, top_k, filters or None
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        elif self.path == '/stats':
+            batcher = self.server.batcher
+            self._send_json(200, {
+                'latency': self.server.latency.summary(),
+                'batches': batcher.batches,
+                'avg_batch_size': batcher.batched_queries / batcher.batches if batcher.batches else 0.0,
+                'query_cache': batcher.session.query_encoder.stats(),
+                'page_cache': batcher.session.page_cache.stats(),
+                'fragment_cache': batcher.session.fragments.stats(),
+                'filtered_subsets': batcher.session.subsets.stats(),
+            })
+        else:
+            self._send_json(404, {'error': f'Unknown endpoint: {self.path}'})
+
+    def _stream_page(self, results, first, chunks, start):
+        """Write the page as it renders; the body is delimited by closing the connection"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('X-Component-Ids', ','.join(str(r['component_id']) for r in results))
+        self.end_headers()
+        self.close_connection = True
+
+        self.wfile.write(first.encode('utf-8'))
+        self.wfile.flush()
+        ttfb_ms = (time.perf_counter() - start) * 1000
+        for chunk in chunks:
+            self.wfile.write(chunk.encode('utf-8'))
+            self.wfile.flush()
+        self.server.latency.record('/generate/stream ttfb', ttfb_ms)
+        self.server.latency.record(self.path, (time.perf_counter() - start) * 1000)
+
+    def do_POST(self):
+        if self.path not in ('/retrieve', '/generate', '/generate/stream'):
+            self._send_json(404, {'error': f'Unknown endpoint: {self.path}'})
+            return
+
+        start = time.perf_counter()
+        try:
+            user_query, top_k, filters = self._read_request()
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {'error': f'Invalid request: {e}'})
+            return
+        if not user_query:
+            self._send_json(400, {'error': 'Missing "query"'})
+            return
+
+        page_cache = self.server.batcher.session.page_cache
+        try:
+            results, website_type, sections = self.server.batcher.analyze(user_query, top_k, filters)
+            if self.path == '/generate/stream':
+                # Render the first chunk before committing to a 200 so an early
+                # failure can still be reported
+                chunks = page_cache.stream(user_query, results, website_type, sections)
+                first = next(chunks, '')
+            else:
+                payload = {'query': user_query, 'components': results, 'sections': sections}
+                if self.path == '/generate':
+                    payload['website_type'] = website_type
+                    payload['html'] = page_cache.generate(user_query, results, website_type, sections)
+        except Exception as e:
+            self._send_json(500, {'error': f'Generation failed: {e}'})
+            return
+
+        if self.path == '/generate/stream':
+            self._stream_page(results, first, chunks, start)
+            return
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        payload['elapsed_ms'] = elapsed_ms
+        self.server.latency.record(self.path, elapsed_ms)
+        self._send_json(200, payload)
+
+
+class GenerationServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Bursts of dozens of concurrent prompts overflow the default backlog of 5
+    request_queue_size = 256
+
+
+def create_server(host=None, port=None, session=None):
+    session = session or gen_session.get_session()
+    server = GenerationServer(
+        (host or config.SERVER_HOST, config.SERVER_PORT if port is None else port),
+        GenerationRequestHandler
+    )
+    server.batcher = QueryBatcher(session)
+    server.latency = LatencyTracker()
+    return server
+
+
+def serve(host=None, port=None):
+    server = create_server(host, port)
+    host, port = server.server_address[:2]
+    print(f"Serving on http://{host}:{port} (POST /retrieve, POST /generate, POST /generate/stream, GET /stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down server")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    serve()
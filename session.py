@@ -0,0 +1,193 @@
+import time
+
+import cache
+import config
+import embeddings
+import fragments
+import generator
+import intent
+import lexical
+import vector_store
+
+
+class GeneratorSession:
+    """Long-lived session that keeps the index, metadata and embedding model resident"""
+
+    def __init__(self, index_path=None, metadata_path=None, model_name=None, backend=None):
+        self.index_path = index_path or config.FAISS_INDEX_PATH
+        self.metadata_path = metadata_path or config.METADATA_PATH
+        self.model_name = model_name or config.EMBEDDING_MODEL
+
+        start = time.perf_counter()
+        self.index = vector_store.load_index(self.index_path)
+        if vector_store.metric_name(self.index) != config.INDEX_METRIC:
+            print(f"⚠️ Index uses the '{vector_store.metric_name(self.index)}' metric but "
+                  f"INDEX_METRIC is '{config.INDEX_METRIC}'. Run `python main.py --migrate-index`.")
+        self.metadata = embeddings.load_metadata(self.metadata_path)
+        self.bm25 = lexical.load_bm25(config.BM25_PATH) if config.HYBRID_SEARCH else None
+        self.subsets = vector_store.SubsetIndexes(self.index, self.metadata)
+        self.backend = backend or config.EMBEDDING_BACKEND
+        self.model = embeddings.load_embedding_model(self.model_name, self.backend)
+        # onnx falls back to torch when its extras are missing, so the backend
+        # is the one that actually loaded
+        self.backend = getattr(self.model, 'embedding_backend', self.backend)
+        # Queries go through the cache; vectors from different backends differ
+        # slightly, so the backend is part of the cache identity
+        self.query_encoder = cache.EmbeddingCache(
+            self.model,
+            f"{self.model_name}:{self.backend}",
+            path=config.QUERY_CACHE_PATH if config.QUERY_CACHE_PERSIST else None
+        )
+        # Website type is classified from the retrieval query vector, so the
+        # prototype centroids are embedded once here
+        self.intents = intent.IntentClassifier(self.model) if config.INTENTS_PATH.exists() else None
+        self.page_cache = cache.get_page_cache()
+        self.fragments = fragments.get_fragment_cache()
+        self.load_time = time.perf_counter() - start
+        self.queries_served = 0
+
+        print(f"Session ready in {self.load_time:.2f}s ({len(self.metadata)} components)")
+
+    def retrieve(self, user_query, top_k=None, filters=None):
+        return vector_store.search_similar_components(
+            user_query,
+            self.query_encoder,
+            self.index,
+            self.metadata,
+            top_k=top_k or config.TOP_K_RESULTS,
+            bm25=self.bm25,
+            filters=filters,
+            subsets=self.subsets
+        )
+
+    def retrieve_many(self, user_queries, top_k=None, filters=None):
+        """Retrieve components for several queries with one encode and one search"""
+        return vector_store.search_many(
+            user_queries,
+            self.query_encoder,
+            self.index,
+            self.metadata,
+            top_k=top_k or config.TOP_K_RESULTS,
+            bm25=self.bm25,
+            filters=filters,
+            subsets=self.subsets
+        )
+
+    def analyze_many(self, user_queries, top_k=None, filters=None):
+        """Embed queries once and use the vectors for retrieval, intent and page sections
+
+        Returns (results, website type, section components) per query; a type
+        is None when the classifier is unsure and the generator's keyword rules
+        apply. With SECTION_RETRIEVAL every prompt adds one sub-query per page
+        section to the same encode and search, so sections cost no extra round.
+        top_k may be a list with one k per query.
+        """
+        user_queries = list(user_queries)
+        if not user_queries:
+            return [], [], []
+        if isinstance(top_k, (list, tuple)):
+            top_ks = [k or config.TOP_K_RESULTS for k in top_k]
+        else:
+            top_ks = [top_k or config.TOP_K_RESULTS] * len(user_queries)
+        sections = [name for name, _ in generator.SECTION_QUERIES] if config.SECTION_RETRIEVAL else []
+        texts = []
+        for user_query in user_queries:
+            texts.append(user_query)
+            if sections:
+                texts.extend(generator.section_queries(user_query))
+        
+        vectors = self.query_encoder.encode(texts)
+        # Sections skip components already on the page, so every row
+        # over-fetches enough candidates to fill its share after deduplication
+        rows = vector_store.search_vectors(
+            vectors,
+            self.index,
+            self.metadata,
+            top_k=max(top_ks) + config.SECTION_TOP_K * len(sections),
+            query_texts=texts,
+            bm25=self.bm25,
+            filters=filters,
+            subsets=self.subsets
+        )
+        stride = 1 + len(sections)
+        # Each query is cut to its own k before sections are deduplicated
+        # against it, so a page does not depend on what it was batched with
+        results = [row[:k] for row, k in zip(rows[::stride], top_ks)]
+        section_components = [
+            assign_sections(main, dict(zip(sections, rows[i * stride + 1:(i + 1) * stride])))
+            for i, main in enumerate(results)
+        ]
+        if self.intents is not None:
+            website_types = self.intents.classify(vectors[::stride])
+        else:
+            website_types = [None] * len(user_queries)
+        return results, website_types, section_components
+
+    def stream(self, user_query, top_k=None, filters=None):
+        """Retrieve components and return (chunks, results, timings) for a streamed page
+
+        Retrieval runs immediately; the page renders as chunks are consumed, and
+        ttfb_ms, generate_ms and total_ms are filled into timings as it does.
+        """
+        start = time.perf_counter()
+        all_results, website_types, all_sections = self.analyze_many([user_query], top_k=top_k, filters=filters)
+        results = all_results[0]
+        retrieved = time.perf_counter()
+        timings = {'retrieve_ms': (retrieved - start) * 1000}
+
+        def chunks():
+            for chunk in self.page_cache.stream(user_query, results, website_types[0], all_sections[0]):
+                if 'ttfb_ms' not in timings:
+                    timings['ttfb_ms'] = (time.perf_counter() - start) * 1000
+                yield chunk
+            finished = time.perf_counter()
+            self.queries_served += 1
+            timings['generate_ms'] = (finished - retrieved) * 1000
+            timings['total_ms'] = (finished - start) * 1000
+
+        return chunks(), results, timings
+
+    def generate(self, user_query, top_k=None, filters=None):
+        """Retrieve components and render a page, returning (html, results, timings)"""
+        chunks, results, timings = self.stream(user_query, top_k=top_k, filters=filters)
+        website_code = ''.join(chunks)
+        return website_code, results, timings
+
+
+def assign_sections(main_results, section_results, per_section=None):
+    """Give each section its best components that are not already on the page"""
+    per_section = config.SECTION_TOP_K if per_section is None else per_section
+    seen = {result['component_id'] for result in main_results}
+    assigned = {}
+    for section, results in section_results.items():
+        picked = []
+        for result in results:
+            if len(picked) == per_section:
+                break
+            if result['component_id'] not in seen:
+                seen.add(result['component_id'])
+                picked.append(result)
+        assigned[section] = picked
+    return assigned
+
+
+_default_session = None
+
+
+def get_session():
+    """Return the process-wide session, loading it on first use"""
+    global _default_session
+    if _default_session is None:
+        _default_session = GeneratorSession()
+    return _default_session
+
+
+def format_latency_report(timings, session):
+    return (
+        f"Retrieval: {timings['retrieve_ms']:.1f} ms | "
+        f"First byte: {timings['ttfb_ms']:.1f} ms | "
+        f"Generation: {timings['generate_ms']:.1f} ms | "
+        f"Total: {timings['total_ms']:.1f} ms "
+        f"(one-time load: {session.load_time * 1000:.0f} ms, "
+        f"queries served: {session.queries_served})"
+    )
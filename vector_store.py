@@ -1,56 +1,931 @@
 import faiss
 import numpy as np
+import heapq
+import json
+import os
 import pickle
-from sentence_transformers import SentenceTransformer
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+from pathlib import Path
 
+import config
+import fragments
+import lexical
+from embeddings import METADATA_FIELDS, MetadataRow, MetadataWriter, hash_text, load_metadata, save_metadata
 
-def create_faiss_index(dimension):
-    index = faiss.IndexFlatL2(dimension)
+
+INDEX_TYPES = ('flat', 'hnsw', 'ivf_flat', 'ivf_pq')
+METRICS = {
+    'cosine': faiss.METRIC_INNER_PRODUCT,
+    'l2': faiss.METRIC_L2,
+}
+
+
+def index_factory_string(index_type, num_vectors, fp16=False, num_train=None):
+    """Build the faiss.index_factory description for a configured index type
+
+    num_train is the number of vectors the index will be trained on, when
+    that is fewer than num_vectors (streamed builds train on a sample).
+    """
+    storage = 'SQfp16' if fp16 else 'Flat'
+    if index_type == 'flat':
+        return storage
+    if index_type == 'hnsw':
+        return f"HNSW{config.HNSW_M}" + (',SQfp16' if fp16 else '')
+    
+    # k-means wants ~39 training points per centroid, so small catalogs (or
+    # training samples) get fewer lists and PQ centroids than configured
+    num_train = num_vectors if num_train is None else num_train
+    nlist = config.IVF_NLIST or int(4 * np.sqrt(num_vectors))
+    nlist = max(1, min(nlist, num_train // 39))
+    if index_type == 'ivf_flat':
+        return f"IVF{nlist},{storage}"
+    if index_type == 'ivf_pq':
+        nbits = max(1, min(config.PQ_NBITS, int(np.log2(max(num_train // 39, 2)))))
+        return f"IVF{nlist},PQ{config.PQ_M}x{nbits}"
+    raise ValueError(f"Unknown index type: {index_type}. Choose from {', '.join(INDEX_TYPES)}")
+
+
+def create_faiss_index(dimension, index_type=None, num_vectors=0, metric=None, fp16=None, num_train=None):
+    # The ID map lets incremental rebuilds remove and re-add individual
+    # components; ids are slots in the metadata list
+    fp16 = config.INDEX_FP16 if fp16 is None else fp16
+    description = index_factory_string(index_type or config.INDEX_TYPE, num_vectors, fp16, num_train)
+    metric_type = METRICS[metric or config.INDEX_METRIC]
+    if description.startswith('IVF'):
+        # IVF indexes store ids natively; an ID map on top would mislabel
+        # vectors after remove_ids because IVF does not compact its ids
+        index = faiss.index_factory(dimension, description, metric_type)
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    else:
+        index = faiss.index_factory(dimension, f"IDMap2,{description}", metric_type)
+    if 'HNSW' in description:
+        faiss.downcast_index(index.index).hnsw.efConstruction = config.HNSW_EF_CONSTRUCTION
+    set_search_params(index)
     return index
 
 
-def add_vectors_to_index(index, embeddings):
-    embeddings_float32 = embeddings.astype('float32')
-    index.add(embeddings_float32)
+def prepare_vectors(index, embeddings):
+    """float32 copy of the vectors, L2-normalized when the index scores by inner product"""
+    vectors = np.array(embeddings, dtype='float32', order='C', copy=True)
+    if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def train_index(index, embeddings):
+    if not index.is_trained:
+        print(f"Training index on {len(embeddings)} vectors...")
+        index.train(prepare_vectors(index, embeddings))
+    return index
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """Apply query-time recall/speed knobs; parameters that do not apply are skipped"""
+    params = faiss.ParameterSpace()
+    nprobe = nprobe or config.IVF_NPROBE
+    ef_search = ef_search or config.HNSW_EF_SEARCH
+    for name, value in (('nprobe', nprobe), ('efSearch', ef_search)):
+        try:
+            params.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass
+    return index
+
+
+def index_memory_bytes(index):
+    if isinstance(index, ShardedIndex):
+        return sum(index_memory_bytes(shard) for shard in index.shards)
+    return faiss.serialize_index(index).nbytes
+
+
+def add_vectors_to_index(index, embeddings, ids=None, shards=None):
+    embeddings_float32 = prepare_vectors(index, embeddings)
+    if ids is None:
+        ids = np.arange(index.ntotal, index.ntotal + len(embeddings))
+    if isinstance(index, ShardedIndex):
+        index.add_with_ids(embeddings_float32, np.asarray(ids, dtype='int64'), shards)
+    else:
+        index.add_with_ids(embeddings_float32, np.asarray(ids, dtype='int64'))
     print(f"Added {len(embeddings)} vectors to FAISS index")
     return index
 
 
+SHARD_KEYS = ('hash', 'category')
+
+
+def shard_of(item, num_shards, shard_by=None):
+    """Stable shard number of a component (sha1, so every process agrees)"""
+    shard_by = shard_by or config.SHARD_BY
+    if shard_by not in SHARD_KEYS:
+        raise ValueError(f"Unknown shard key: {shard_by}. Choose from {', '.join(SHARD_KEYS)}")
+    key = item['component_id'] if shard_by == 'hash' else item['category']
+    return int(hash_text(str(key))[:8], 16) % num_shards
+
+
+def merge_topk(distances, labels, k, descending):
+    """k-way heap merge of per-shard (queries, k) results, each row already sorted"""
+    num_queries = distances[0].shape[0]
+    merged_distances = np.full((num_queries, k), -np.inf if descending else np.inf, dtype='float32')
+    merged_labels = np.full((num_queries, k), -1, dtype='int64')
+    for q in range(num_queries):
+        rows = [zip(d[q].tolist(), i[q].tolist()) for d, i in zip(distances, labels)]
+        for j, (distance, label) in enumerate(heapq.merge(*rows, key=itemgetter(0), reverse=descending)):
+            # FAISS pads short rows with -1 at the worst distance, so once one
+            # appears every remaining entry is padding
+            if j == k or label < 0:
+                break
+            merged_distances[q, j] = distance
+            merged_labels[q, j] = label
+    return merged_distances, merged_labels
+
+
+class ShardedIndex:
+    """Several FAISS indexes over disjoint sets of slots, searched in parallel
+
+    Provides the parts of the faiss.Index interface the store relies on
+    (search, reconstruct_batch, add_with_ids, remove_ids), so retrieval,
+    filtering and MMR work unchanged. Ids stay global metadata slots; owner
+    maps each slot to its shard (-1 when it holds no vector).
+    """
+
+    def __init__(self, shards, owner=None, shard_by=None):
+        self.shards = list(shards)
+        self.owner = np.full(0, -1, dtype='int16') if owner is None else np.asarray(owner, dtype='int16')
+        self.shard_by = shard_by or config.SHARD_BY
+        self.d = self.shards[0].d
+        self.metric_type = self.shards[0].metric_type
+        self.is_trained = True
+        # Shards whose file is out of date; only these are rewritten on save
+        self.dirty = set(range(len(self.shards)))
+        self.pool = ThreadPoolExecutor(max_workers=config.SHARD_SEARCH_THREADS or len(self.shards))
+
+    @property
+    def ntotal(self):
+        return sum(shard.ntotal for shard in self.shards)
+
+    def search(self, x, k, params=None):
+        live = [shard for shard in self.shards if shard.ntotal]
+        if not live:
+            return (
+                np.full((len(x), k), -np.inf, dtype='float32'),
+                np.full((len(x), k), -1, dtype='int64'),
+            )
+        # FAISS releases the GIL while searching, so the shards run concurrently
+        parts = list(self.pool.map(lambda shard: shard.search(x, k, params=params), live))
+        return merge_topk(
+            [distances for distances, _ in parts],
+            [labels for _, labels in parts],
+            k,
+            self.metric_type == faiss.METRIC_INNER_PRODUCT
+        )
+
+    def reconstruct_batch(self, ids):
+        ids = np.asarray(ids, dtype='int64')
+        vectors = np.empty((len(ids), self.d), dtype='float32')
+        owners = self.owner[ids]
+        for shard in np.unique(owners).tolist():
+            rows = owners == shard
+            vectors[rows] = self.shards[shard].reconstruct_batch(ids[rows])
+        return vectors
+
+    def add_with_ids(self, x, ids, shards):
+        """Add vectors to the given shards in parallel, training any shard on its first vectors"""
+        if shards is None:
+            raise ValueError("Vectors added to a sharded index need a shard each")
+        shards = np.asarray(shards, dtype='int16')
+        if len(ids) and ids.max() >= len(self.owner):
+            self.owner = np.concatenate([self.owner, np.full(ids.max() + 1 - len(self.owner), -1, dtype='int16')])
+
+        def add(shard):
+            rows = shards == shard
+            train_index(self.shards[shard], x[rows])
+            self.shards[shard].add_with_ids(x[rows], ids[rows])
+
+        targets = np.unique(shards).tolist()
+        list(self.pool.map(add, targets))
+        self.owner[ids] = shards
+        self.dirty.update(targets)
+
+    def remove_ids(self, ids):
+        ids = np.asarray(ids, dtype='int64')
+        ids = ids[(ids < len(self.owner))]
+        owners = self.owner[ids]
+        for shard in np.unique(owners[owners >= 0]).tolist():
+            # HNSW shards are rebuilt by remove_from_index; only touched shards pay
+            self.shards[shard] = remove_from_index(self.shards[shard], ids[owners == shard])
+            self.dirty.add(shard)
+        self.owner[ids] = -1
+        return int((owners >= 0).sum())
+
+
+def create_sharded_index(dimension, num_shards=None, num_vectors=0, metric=None, shard_by=None, train_counts=None):
+    """Empty shards sized for num_vectors; train_counts[s] is how many vectors shard s will train on"""
+    num_shards = num_shards or config.NUM_SHARDS
+    per_shard = max(1, num_vectors // num_shards)
+    train_counts = train_counts if train_counts is not None else [None] * num_shards
+    return ShardedIndex(
+        [
+            create_faiss_index(dimension, num_vectors=per_shard, metric=metric, num_train=count)
+            for count in train_counts
+        ],
+        shard_by=shard_by
+    )
+
+
+def training_rows(num_rows, num_shards=None):
+    """Rows a streamed build holds back to train IVF lists: ~39 per list, at most INGEST_TRAIN_SIZE"""
+    if not config.INDEX_TYPE.startswith('ivf'):
+        return 0
+    if not num_rows:
+        return config.INGEST_TRAIN_SIZE
+    num_shards = num_shards or config.NUM_SHARDS
+    nlist = config.IVF_NLIST or int(4 * np.sqrt(max(1, num_rows // num_shards)))
+    return min(39 * nlist * num_shards, num_rows, config.INGEST_TRAIN_SIZE)
+
+
+def build_sharded_index(embeddings, metadata, num_shards=None, shard_by=None):
+    """Train and fill every shard from its own rows, all shards in parallel"""
+    num_shards = num_shards or config.NUM_SHARDS
+    shards = np.array([shard_of(item, num_shards, shard_by) for item in metadata], dtype='int16')
+    counts = np.bincount(shards, minlength=num_shards)
+    index = ShardedIndex(
+        [create_faiss_index(embeddings.shape[1], num_vectors=max(1, int(count))) for count in counts],
+        shard_by=shard_by
+    )
+    add_vectors_to_index(index, embeddings, ids=np.arange(len(embeddings)), shards=shards)
+    return index
+
+
+def shard_dir(index_path):
+    index_path = Path(index_path)
+    return index_path.with_name(index_path.stem + '_shards')
+
+
+def index_exists(index_path):
+    return Path(index_path).exists() or (shard_dir(index_path) / 'shards.json').exists()
+
+
+def _write_atomic(path, write):
+    tmp_path = path.with_name(path.name + '.tmp')
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def save_sharded_index(index, path):
+    """Write changed shards (each atomically), the slot owners and the shard layout"""
+    path.mkdir(parents=True, exist_ok=True)
+    dirty = sorted(index.dirty)
+    list(index.pool.map(
+        lambda i: _write_atomic(path / f'shard_{i:03d}.faiss', lambda p: faiss.write_index(index.shards[i], str(p))),
+        dirty
+    ))
+
+    def write_owner(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            np.save(f, index.owner)
+
+    _write_atomic(path / 'owner.npy', write_owner)
+    info = {'num_shards': len(index.shards), 'shard_by': index.shard_by}
+    _write_atomic(path / 'shards.json', lambda p: p.write_text(json.dumps(info), encoding='utf-8'))
+    for stale in path.glob('shard_*.faiss'):
+        if int(stale.stem.split('_')[1]) >= len(index.shards):
+            stale.unlink()
+    index.dirty.clear()
+    return dirty
+
+
+def load_sharded_index(path):
+    info = json.loads((path / 'shards.json').read_text(encoding='utf-8'))
+    with ThreadPoolExecutor(max_workers=info['num_shards']) as pool:
+        shards = list(pool.map(
+            lambda i: set_search_params(faiss.read_index(str(path / f'shard_{i:03d}.faiss'))),
+            range(info['num_shards'])
+        ))
+    index = ShardedIndex(shards, np.load(path / 'owner.npy'), info['shard_by'])
+    index.dirty.clear()
+    return index
+
+
 def save_index(index, index_path):
+    shards_path = shard_dir(index_path)
+    if isinstance(index, ShardedIndex):
+        written = save_sharded_index(index, shards_path)
+        Path(index_path).unlink(missing_ok=True)
+        print(f"Saved {len(written)} of {len(index.shards)} FAISS shards to {shards_path}")
+        return
     faiss.write_index(index, str(index_path))
+    shutil.rmtree(shards_path, ignore_errors=True)
     print(f"Saved FAISS index to {index_path}")
 
 
 def load_index(index_path):
+    shards_path = shard_dir(index_path)
+    if (shards_path / 'shards.json').exists():
+        index = load_sharded_index(shards_path)
+        print(f"Loaded {len(index.shards)} FAISS shards from {shards_path}")
+        return index
     index = faiss.read_index(str(index_path))
+    set_search_params(index)
     print(f"Loaded FAISS index from {index_path}")
     return index
 
 
-def search_similar_components(query_text, model, index, metadata, top_k=5):
-    query_embedding = model.encode([query_text], convert_to_numpy=True)[0]
-    query_embedding = query_embedding.astype('float32').reshape(1, -1)
+def search_similar_components(query_text, model, index, metadata, top_k=5, bm25=None, filters=None, subsets=None, mmr_lambda=None):
+    return search_many(
+        [query_text], model, index, metadata, top_k=top_k, bm25=bm25, filters=filters, subsets=subsets,
+        mmr_lambda=mmr_lambda
+    )[0]
+
+
+def search_many(query_texts, model, index, metadata, top_k=5, batch_size=64, bm25=None, filters=None, subsets=None, mmr_lambda=None):
+    """Encode all queries in one batched pass and run a single FAISS search"""
+    query_texts = list(query_texts)
+    if not query_texts:
+        return []
+    
+    query_embeddings = model.encode(query_texts, batch_size=batch_size, convert_to_numpy=True)
+    return search_vectors(
+        query_embeddings, index, metadata, top_k=top_k, query_texts=query_texts, bm25=bm25,
+        filters=filters, subsets=subsets, mmr_lambda=mmr_lambda
+    )
+
+
+def search_vectors(query_embeddings, index, metadata, top_k=5, query_texts=None, bm25=None, filters=None, subsets=None, mmr_lambda=None):
+    """Search with query vectors that were already encoded (e.g. shared with intent)
+
+    With a BM25 index and the query texts, the dense and lexical candidate
+    lists are fused by reciprocal rank fusion. filters (e.g.
+    {'category': 'Dashboard'}) restrict both to matching components through
+    the sub-indexes in subsets. mmr_lambda (default MMR_LAMBDA when
+    MMR_ENABLED) re-ranks the candidates by maximal marginal relevance.
+    """
+    if mmr_lambda is None and config.MMR_ENABLED:
+        mmr_lambda = config.MMR_LAMBDA
+    query_embeddings = prepare_vectors(index, query_embeddings).reshape(len(query_embeddings), -1)
+    search = index.search
+    allowed = None
+    if filters:
+        subset = (subsets or SubsetIndexes(index, metadata)).get(filters)
+        search, allowed = subset.search, subset.slots
+    
+    if bm25 is None or query_texts is None:
+        if mmr_lambda is None:
+            distances, indices = search(query_embeddings, top_k)
+            return results_from_search(distances, indices, metadata, index.metric_type)
+        distances, indices = search(query_embeddings, max(top_k, config.MMR_CANDIDATES))
+        positions = diversify(index, scores_from_distances(distances, index.metric_type), indices, top_k, mmr_lambda)
+        distances = np.take_along_axis(distances, positions.clip(0), axis=1)
+        indices = np.where(positions >= 0, np.take_along_axis(indices, positions.clip(0), axis=1), -1)
+        return results_from_search(distances, indices, metadata, index.metric_type)
+    
+    candidates = max(top_k, config.HYBRID_CANDIDATES)
+    distances, indices = search(query_embeddings, candidates)
+    return hybrid_results(
+        query_texts,
+        scores_from_distances(distances, index.metric_type),
+        indices,
+        metadata,
+        bm25,
+        top_k,
+        candidates,
+        allowed,
+        index,
+        mmr_lambda
+    )
+
+
+def hybrid_results(query_texts, dense_scores, dense_indices, metadata, bm25, top_k, candidates, allowed=None, index=None, mmr_lambda=None):
+    rows = []
+    for text, row_scores, row_indices in zip(query_texts, dense_scores.tolist(), dense_indices.tolist()):
+        dense = {idx: score for idx, score in zip(row_indices, row_scores) if 0 <= idx < len(metadata)}
+        lexical_ids, lexical_scores = bm25.search(text, candidates, allowed=allowed)
+        lexical_hits = dict(zip(lexical_ids.tolist(), lexical_scores.tolist()))
+        rows.append((dense, lexical_hits, lexical.reciprocal_rank_fusion([list(dense), list(lexical_hits)])))
     
-    distances, indices = index.search(query_embedding, top_k)
+    if mmr_lambda is not None and rows:
+        # Fused scores are rescaled so each row's best candidate has relevance 1
+        width = max(top_k, config.MMR_CANDIDATES)
+        ids = np.full((len(rows), width), -1, dtype='int64')
+        relevance = np.zeros((len(rows), width), dtype='float32')
+        for i, (_, _, fused) in enumerate(rows):
+            head = fused[:width]
+            if head:
+                ids[i, :len(head)] = [idx for idx, _ in head]
+                relevance[i, :len(head)] = [score / head[0][1] for _, score in head]
+        positions = diversify(index, relevance, ids, top_k, mmr_lambda)
+        rows = [
+            (dense, lexical_hits, [fused[p] for p in row_positions if p >= 0])
+            for (dense, lexical_hits, fused), row_positions in zip(rows, positions.tolist())
+        ]
     
-    results = []
-    for idx, distance in zip(indices[0], distances[0]):
-        if idx < len(metadata):
-            result = metadata[idx].copy()
-            result['similarity_score'] = float(1 / (1 + distance))
-            results.append(result)
+    all_results = []
+    for dense, lexical_hits, fused_ranking in rows:
+        results = []
+        for idx, fused in fused_ranking:
+            item = metadata[idx] if idx < len(metadata) else None
+            if item is None:
+                continue
+            # similarity_score stays the dense cosine (0 for lexical-only hits)
+            results.append(with_scores(
+                item,
+                similarity_score=dense.get(idx, 0.0),
+                lexical_score=lexical_hits.get(idx, 0.0),
+                fusion_score=fused,
+            ))
+            if len(results) == top_k:
+                break
+        all_results.append(results)
+    return all_results
+
+
+def candidate_vectors(index, ids):
+    """Unit-length stored vectors for an id matrix; -1 padding comes back as zeros"""
+    flat = ids.ravel()
+    valid = flat >= 0
+    vectors = np.zeros((len(flat), index.d), dtype='float32')
+    if valid.any():
+        vectors[valid] = index.reconstruct_batch(flat[valid])
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors.reshape(*ids.shape, index.d)
+
+
+def mmr_select(relevance, vectors, k, mmr_lambda):
+    """Greedy maximal marginal relevance over every query's candidates at once
+
+    relevance is (queries, n) with -inf marking padding and vectors is
+    (queries, n, d) unit-length. Each step scores all candidates of all queries
+    as lambda * relevance - (1 - lambda) * max cosine to those already picked.
+    Returns (queries, k) positions into the candidates, -1 where a row runs out.
+    """
+    num_queries, n = relevance.shape
+    k = min(k, n)
+    available = np.isfinite(relevance)
+    relevance = np.where(available, relevance, 0.0)
+    similarity = vectors @ vectors.transpose(0, 2, 1)
+    penalty = np.zeros((num_queries, n), dtype='float32')
+    picked = np.full((num_queries, k), -1, dtype='int64')
+    rows = np.arange(num_queries)
+    for step in range(k):
+        scores = np.where(available, mmr_lambda * relevance - (1 - mmr_lambda) * penalty, -np.inf)
+        best = scores.argmax(axis=1)
+        found = available[rows, best]
+        picked[found, step] = best[found]
+        available[rows, best] = False
+        penalty = similarity[rows, best] if step == 0 else np.maximum(penalty, similarity[rows, best])
+    return picked
+
+
+def diversify(index, relevance, ids, top_k, mmr_lambda):
+    """MMR positions (queries, top_k) into rows of candidate ids, using their stored vectors"""
+    relevance = np.where(ids >= 0, relevance, -np.inf)
+    return mmr_select(relevance, candidate_vectors(index, ids), top_k, mmr_lambda)
+
+
+def scores_from_distances(distances, metric_type):
+    # Inner product over normalized vectors is already the cosine similarity;
+    # legacy L2 indexes keep their 1 / (1 + distance) score
+    if metric_type == faiss.METRIC_INNER_PRODUCT:
+        return distances
+    return 1.0 / (1.0 + distances)
+
+
+def with_scores(item, **scores):
+    # Rows from the columnar store keep their slot so cards can be read by it
+    if isinstance(item, MetadataRow):
+        return item.with_fields(**scores)
+    return {**item, **scores}
+
+
+def results_from_search(distances, indices, metadata, metric_type=faiss.METRIC_L2):
+    """Turn FAISS (distances, indices) matrices into per-query result lists"""
+    scores = scores_from_distances(distances, metric_type).tolist()
+    valid = ((indices >= 0) & (indices < len(metadata))).tolist()
+    indices = indices.tolist()
     
-    return results
+    # Only the returned rows are materialized; slots freed by incremental
+    # rebuilds hold None until they are reused
+    all_results = []
+    for row_indices, row_scores, row_valid in zip(indices, scores, valid):
+        results = []
+        for idx, score, ok in zip(row_indices, row_scores, row_valid):
+            item = metadata[idx] if ok else None
+            if item is not None:
+                results.append(with_scores(item, similarity_score=score))
+        all_results.append(results)
+    return all_results
+
+
+def filter_key(filters):
+    """Hashable canonical form of {field: value or [values]}, or None for no filter"""
+    if not filters:
+        return None
+    key = []
+    for field, values in filters.items():
+        if field not in METADATA_FIELDS:
+            raise ValueError(f"Unknown filter field: {field}. Choose from {', '.join(METADATA_FIELDS)}")
+        if isinstance(values, (str, int, float)):
+            values = [values]
+        key.append((field, tuple(sorted({str(value) for value in values}))))
+    return tuple(sorted(key))
+
+
+class SubsetIndex:
+    """Search restricted to a sorted array of slots"""
+
+    def __init__(self, index, slots, max_size=None):
+        self.slots = slots
+        max_size = config.FILTER_SUBINDEX_MAX_SIZE if max_size is None else max_size
+        if len(slots) <= max_size:
+            # A flat copy of just the matching vectors: exact, and each query
+            # scans the subset only (graph and IVF searches lose recall when
+            # most of the neighbours they visit are filtered out)
+            self.index = faiss.IndexFlat(index.d, index.metric_type)
+            if len(slots):
+                self.index.add(index.reconstruct_batch(slots))
+            self.params = None
+            return
+        
+        # Large subsets cover much of the catalog, so the main index is
+        # searched for proportionally more neighbours and filtered
+        self.index = index
+        self.expansion = 2 * max(index.ntotal, 1) / len(slots)
+        self.mask = np.zeros(slots[-1] + 1, dtype=bool)
+        self.mask[slots] = True
+        # Rows still short of k fall back to an ID selector, which must
+        # outlive the parameters that point at it
+        self.selector = faiss.IDSelectorBatch(slots)
+        # Shards share one layout, so the first decides the parameter type
+        probe = index.shards[0] if isinstance(index, ShardedIndex) else index
+        ivf = faiss.try_extract_index_ivf(probe)
+        if ivf is not None:
+            self.params = faiss.SearchParametersIVF(sel=self.selector, nprobe=ivf.nprobe)
+        else:
+            self.params = faiss.SearchParameters(sel=self.selector)
+
+    def search(self, vectors, k):
+        if self.params is None:
+            distances, positions = self.index.search(vectors, k)
+            if not len(self.slots):
+                return distances, positions
+            return distances, np.where(positions >= 0, self.slots[positions], -1)
+        
+        distances, ids = self.index.search(vectors, int(np.ceil(k * self.expansion)))
+        keep = (ids >= 0) & (ids < len(self.mask))
+        keep[keep] = self.mask[ids[keep]]
+        # Stable sort moves the matching ids to the front, keeping rank order
+        order = np.argsort(~keep, axis=1, kind='stable')[:, :k]
+        rows = np.arange(len(ids))[:, None]
+        distances, ids, keep = distances[rows, order], ids[rows, order], keep[rows, order]
+        ids[~keep] = -1
+        short = np.flatnonzero(keep.sum(axis=1) < min(k, len(self.slots)))
+        if len(short):
+            distances[short], ids[short] = self.index.search(vectors[short], k, params=self.params)
+        return distances, ids
+
 
+class SubsetIndexes:
+    """Sub-indexes per metadata filter, built on first use and kept in an LRU
 
-def build_vector_database(embeddings, metadata, index_path, metadata_path):
+    A filtered query costs the size of its subset instead of the whole catalog;
+    the value -> slots map of each filtered field is built once per session.
+    """
+
+    def __init__(self, index, metadata, max_size=None, cache_size=None):
+        self.index = index
+        self.metadata = metadata
+        self.max_size = max_size
+        self.cache_size = cache_size or config.FILTER_CACHE_SIZE
+        self.columns = {}
+        self.subsets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def value_slots(self, field):
+        """Map each value of a metadata field to the sorted slots holding it"""
+        columns = self.columns.get(field)
+        if columns is None:
+            if hasattr(self.metadata, 'column'):
+                values = self.metadata.column(field)
+            else:
+                values = [None if item is None else str(item[field]) for item in self.metadata]
+            groups = {}
+            for slot, value in enumerate(values):
+                if value is not None:
+                    groups.setdefault(value, []).append(slot)
+            columns = {value: np.array(slots, dtype='int64') for value, slots in groups.items()}
+            self.columns[field] = columns
+        return columns
+
+    def slots(self, key):
+        """Slots matching any of the values of every filtered field"""
+        matched = None
+        for field, values in key:
+            columns = self.value_slots(field)
+            slots = np.unique(np.concatenate([columns.get(value, np.zeros(0, dtype='int64')) for value in values]))
+            matched = slots if matched is None else np.intersect1d(matched, slots, assume_unique=True)
+        return matched
+
+    def get(self, filters):
+        key = filter_key(filters)
+        with self.lock:
+            subset = self.subsets.get(key)
+            if subset is not None:
+                self.subsets.move_to_end(key)
+                return subset
+        subset = SubsetIndex(self.index, self.slots(key), self.max_size)
+        with self.lock:
+            self.subsets[key] = subset
+            while len(self.subsets) > self.cache_size:
+                self.subsets.popitem(last=False)
+        return subset
+
+    def stats(self):
+        return {
+            'subsets': len(self.subsets),
+            'subset_vectors': sum(len(subset.slots) for subset in self.subsets.values()),
+            'fields': sorted(self.columns),
+        }
+
+
+def build_vector_database(embeddings, metadata, index_path, metadata_path, texts=None, manifest_path=None, model_name=None, bm25_path=None):
     dimension = embeddings.shape[1]
-    index = create_faiss_index(dimension)
-    index = add_vectors_to_index(index, embeddings)
+    if config.NUM_SHARDS > 1:
+        index = build_sharded_index(embeddings, metadata)
+    else:
+        index = create_faiss_index(dimension, num_vectors=len(embeddings))
+        train_index(index, embeddings)
+        index = add_vectors_to_index(index, embeddings)
     save_index(index, index_path)
     
-    with open(metadata_path, 'wb') as f:
-        pickle.dump(metadata, f)
+    # Snippet cards are rendered here, once per build, instead of per request
+    metadata = [MetadataRow(item, slot=slot) if item is not None else None for slot, item in enumerate(metadata)]
+    cards = fragments.card_columns(metadata, fragments.open_card_store(metadata_path))
+    save_metadata(metadata, metadata_path, fragments.FRAGMENT_FIELDS, cards)
+    if bm25_path is not None:
+        lexical.build_bm25(metadata, bm25_path)
+    
+    if manifest_path is not None and texts is not None:
+        save_manifest({
+            'model_name': model_name,
+            'index_type': config.INDEX_TYPE,
+            'metric': config.INDEX_METRIC,
+            'fp16': config.INDEX_FP16,
+            'num_shards': config.NUM_SHARDS,
+            'shard_by': config.SHARD_BY,
+            'dimension': dimension,
+            'entries': {
+                item['component_id']: (slot, hash_text(text))
+                for slot, (item, text) in enumerate(zip(metadata, texts))
+            },
+        }, manifest_path)
     
     print("Vector database built successfully!")
-    return index
\ No newline at end of file
+    return index
+
+
+def build_vector_database_streaming(chunks, model, index_path, metadata_path, manifest_path=None, model_name=None, bm25_path=None, num_rows=None):
+    """Full build that encodes and indexes (texts, metadata) chunks as they stream in
+
+    num_rows, the catalog size when known up front, sizes the IVF lists for
+    the whole catalog. IVF indexes are trained on the first training_rows()
+    rows, which are held back until that many have been encoded; the list
+    count is capped by what that sample can train.
+    """
+    start = time.perf_counter()
+    # Snippet cards are rendered here, once per build, instead of per request;
+    # cards from the store being replaced are reused where nothing changed
+    previous_cards = fragments.open_card_store(metadata_path)
+    writer = MetadataWriter(metadata_path, fragments.FRAGMENT_FIELDS)
+    entries = {}
+    bm25_writer = lexical.BM25Writer(bm25_path) if bm25_path is not None else None
+    index = None
+    rows = 0
+    train_target = training_rows(num_rows)
+    held = []
+    
+    def ingest(texts, metadata, vectors):
+        nonlocal rows
+        shards = [shard_of(item, config.NUM_SHARDS) for item in metadata] if config.NUM_SHARDS > 1 else None
+        add_vectors_to_index(index, vectors, ids=np.arange(rows, rows + len(vectors)), shards=shards)
+        metadata = [MetadataRow(item, slot=slot) for slot, item in enumerate(metadata, rows)]
+        writer.append(metadata, fragments.card_columns(metadata, previous_cards))
+        if bm25_writer is not None:
+            bm25_writer.append(metadata)
+        for slot, (item, text) in enumerate(zip(metadata, texts), rows):
+            entries[item['component_id']] = (slot, hash_text(text))
+        rows += len(texts)
+        
+        elapsed = time.perf_counter() - start
+        print(f"Ingested {rows} rows ({rows / elapsed:.0f} rows/sec)")
+    
+    def train_on_held():
+        # The held-back rows go in as one add, so every shard trains on all
+        # of its sample rather than on its share of the first chunk
+        nonlocal index, held
+        texts = [text for chunk in held for text in chunk[0]]
+        metadata = [item for chunk in held for item in chunk[1]]
+        vectors = np.concatenate([chunk[2] for chunk in held])
+        held = []
+        num_vectors = max(num_rows or 0, len(vectors))
+        if config.NUM_SHARDS > 1:
+            counts = np.bincount([shard_of(item, config.NUM_SHARDS) for item in metadata], minlength=config.NUM_SHARDS)
+            index = create_sharded_index(vectors.shape[1], num_vectors=num_vectors, train_counts=counts.tolist())
+        else:
+            index = create_faiss_index(vectors.shape[1], num_vectors=num_vectors, num_train=len(vectors))
+            train_index(index, vectors)
+        ingest(texts, metadata, vectors)
+    
+    for texts, metadata in chunks:
+        vectors = model.encode(texts, show_progress_bar=False, convert_to_numpy=True)
+        if index is not None:
+            ingest(texts, metadata, vectors)
+            continue
+        held.append((texts, metadata, vectors))
+        if sum(len(chunk[0]) for chunk in held) >= train_target:
+            train_on_held()
+    
+    if held:
+        # The whole catalog fit in the training sample
+        train_on_held()
+    
+    if index is None:
+        raise ValueError("No components to index")
+    
+    save_index(index, index_path)
+    writer.close()
+    if bm25_writer is not None:
+        bm25_writer.close()
+    if manifest_path is not None:
+        save_manifest({
+            'model_name': model_name,
+            'index_type': config.INDEX_TYPE,
+            'metric': config.INDEX_METRIC,
+            'fp16': config.INDEX_FP16,
+            'num_shards': config.NUM_SHARDS,
+            'shard_by': config.SHARD_BY,
+            'dimension': index.d,
+            'entries': entries,
+        }, manifest_path)
+    
+    elapsed = time.perf_counter() - start
+    print(f"Vector database built successfully! {rows} rows in {elapsed:.1f}s ({rows / elapsed:.0f} rows/sec)")
+    return index
+
+
+def save_manifest(manifest, manifest_path):
+    with open(manifest_path, 'wb') as f:
+        pickle.dump(manifest, f)
+
+
+def load_manifest(manifest_path):
+    with open(manifest_path, 'rb') as f:
+        return pickle.load(f)
+
+
+def remove_from_index(index, ids):
+    try:
+        index.remove_ids(np.array(ids, dtype='int64'))
+        return index
+    except RuntimeError:
+        pass
+    
+    # HNSW graphs cannot delete nodes; rebuild from the stored vectors instead
+    # of re-embedding anything
+    all_ids = faiss.vector_to_array(index.id_map)
+    vectors = index.index.reconstruct_n(0, index.ntotal)
+    keep = ~np.isin(all_ids, np.array(ids, dtype='int64'))
+    rebuilt = create_faiss_index(index.d, num_vectors=int(keep.sum()), metric=metric_name(index))
+    train_index(rebuilt, vectors[keep])
+    return add_vectors_to_index(rebuilt, vectors[keep], ids=all_ids[keep])
+
+
+def metric_name(index):
+    return 'cosine' if index.metric_type == faiss.METRIC_INNER_PRODUCT else 'l2'
+
+
+def migrate_index(index_path, manifest_path=None):
+    """Convert an L2 index file to the configured cosine/fp16 layout without re-embedding"""
+    index = load_index(index_path)
+    if isinstance(index, ShardedIndex):
+        raise ValueError("Sharded indexes cannot be migrated; rebuild with `python main.py --full-rebuild`")
+    if index.metric_type == METRICS[config.INDEX_METRIC]:
+        print(f"Index already uses the '{config.INDEX_METRIC}' metric, nothing to migrate")
+        return index
+    
+    if isinstance(index, faiss.IndexIDMap2):
+        ids = faiss.vector_to_array(index.id_map)
+        vectors = index.index.reconstruct_n(0, index.ntotal)
+        index_type = 'hnsw' if 'HNSW' in type(faiss.downcast_index(index.index)).__name__ else 'flat'
+    elif isinstance(faiss.downcast_index(index), faiss.IndexFlat):
+        # Indexes built before the ID map: labels are row positions
+        ids = np.arange(index.ntotal)
+        vectors = index.reconstruct_n(0, index.ntotal)
+        index_type = 'flat'
+    else:
+        raise ValueError(
+            "Only flat and HNSW indexes store exact vectors; "
+            "rebuild this index with `python main.py --full-rebuild`"
+        )
+    
+    backup_path = index_path.with_name(index_path.name + '.l2.bak')
+    save_index(index, backup_path)
+    
+    migrated = create_faiss_index(index.d, index_type=index_type, num_vectors=len(vectors))
+    add_vectors_to_index(migrated, vectors, ids=ids)
+    save_index(migrated, index_path)
+    
+    if manifest_path is not None and manifest_path.exists():
+        manifest = load_manifest(manifest_path)
+        manifest.update({'index_type': index_type, 'metric': config.INDEX_METRIC, 'fp16': config.INDEX_FP16})
+        save_manifest(manifest, manifest_path)
+    
+    print(f"Migrated {migrated.ntotal} vectors to a {config.INDEX_METRIC} index (backup at {backup_path})")
+    return migrated
+
+
+def can_update_incrementally(index_path, manifest_path, model_name):
+    if not (index_exists(index_path) and manifest_path.exists()):
+        return False
+    manifest = load_manifest(manifest_path)
+    num_shards = manifest.get('num_shards', 1)
+    return (
+        manifest.get('model_name') == model_name
+        and manifest.get('index_type', 'flat') == config.INDEX_TYPE
+        and manifest.get('metric', 'l2') == config.INDEX_METRIC
+        and manifest.get('fp16', False) == config.INDEX_FP16
+        and num_shards == config.NUM_SHARDS
+        and (num_shards == 1 or manifest.get('shard_by') == config.SHARD_BY)
+    )
+
+
+def update_vector_database(texts, metadata, model, index_path, metadata_path, manifest_path, bm25_path=None):
+    """Re-embed only new or changed components and patch the index in place"""
+    manifest = load_manifest(manifest_path)
+    index = load_index(index_path)
+    stored_metadata = list(load_metadata(metadata_path))
+    
+    entries = manifest['entries']
+    hashes = [hash_text(text) for text in texts]
+    current_ids = {item['component_id'] for item in metadata}
+    
+    stale = [cid for cid in entries if cid not in current_ids]
+    changed = []
+    for i, (item, text_hash) in enumerate(zip(metadata, hashes)):
+        entry = entries.get(item['component_id'])
+        if entry is None or entry[1] != text_hash:
+            changed.append(i)
+            if entry is not None:
+                stale.append(item['component_id'])
+    
+    # Drop removed and changed rows from the index and free their slots
+    live_slots = {slot for slot, _ in entries.values()}
+    free_slots = [slot for slot in range(len(stored_metadata)) if slot not in live_slots]
+    if stale:
+        stale_slots = [entries.pop(cid)[0] for cid in stale]
+        index = remove_from_index(index, stale_slots)
+        for slot in stale_slots:
+            stored_metadata[slot] = None
+        free_slots.extend(stale_slots)
+    heapq.heapify(free_slots)
+    
+    if changed:
+        vectors = model.encode([texts[i] for i in changed], show_progress_bar=True, convert_to_numpy=True)
+        slots = []
+        for i in changed:
+            if free_slots:
+                slot = heapq.heappop(free_slots)
+            else:
+                slot = len(stored_metadata)
+                stored_metadata.append(None)
+            slots.append(slot)
+            entries[metadata[i]['component_id']] = (slot, hashes[i])
+        shards = None
+        if isinstance(index, ShardedIndex):
+            shards = [shard_of(metadata[i], len(index.shards), index.shard_by) for i in changed]
+        add_vectors_to_index(index, vectors, ids=slots, shards=shards)
+    
+    # Fields outside the embedding text (e.g. code_snippet) can change without
+    # needing a new vector, so every live row is refreshed
+    for item in metadata:
+        slot = entries[item['component_id']][0]
+        stored_metadata[slot] = MetadataRow(item, slot=slot)
+    
+    save_index(index, index_path)
+    # Only cards whose name, category or snippet changed are re-rendered
+    cards = fragments.card_columns(stored_metadata, fragments.open_card_store(metadata_path))
+    save_metadata(stored_metadata, metadata_path, fragments.FRAGMENT_FIELDS, cards)
+    if bm25_path is not None:
+        # Postings are keyed by slot, so the lexical index is rebuilt over the
+        # patched slot layout (tokenizing is cheap next to embedding)
+        lexical.build_bm25(stored_metadata, bm25_path)
+    manifest['entries'] = entries
+    save_manifest(manifest, manifest_path)
+    
+    print(f"Incremental update: {len(changed)} embedded, {len(metadata) - len(changed)} reused, "
+          f"{len(stale)} stale vectors removed")
+    return index